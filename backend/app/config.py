@@ -5,12 +5,22 @@ from pathlib import Path
 env_file = Path(__file__).parent.parent / ".env"
 
 class Settings(BaseSettings):
-    # Database (deprecated - using Google Sheets)
+    # Database (primary transaction store, SQLite in WAL mode)
     database_url: str = "sqlite:///./coinconvert.db"
+    storage_backend: str = "sqlite"  # 'sqlite' or 'sheets'
+    sheets_mirror_enabled: bool = True  # Copy sqlite writes to Google Sheets when it is configured
+    runtime_dir: str = "."  # Lock files and other local state shared between processes
     
     # Google Sheets Configuration
     google_sheets_credentials_file: str = ""
     google_sheets_spreadsheet_id: str = ""
+    sheets_reconcile_seconds: int = 60  # Delta-sync cached Transactions sheet to pick up manual edits (0 disables)
+    sheets_full_reconcile_seconds: int = 1800  # Full re-download, for edits that do not touch updated_at
+    sheets_read_quota_per_minute: int = 60  # Shared by the API and bot processes (0 disables the governor)
+    sheets_write_quota_per_minute: int = 60
+    sheets_flush_interval_seconds: float = 2.0  # How often queued mirror writes are sent to Google Sheets
+    sheets_flush_batch_size: int = 200  # Max journal entries coalesced into one flush
+    sheets_flush_max_backoff_seconds: float = 300.0  # Upper bound for retry backoff after Sheets API errors
     
     # Security
     secret_key: str = "your-secret-key-here"
@@ -22,8 +32,23 @@ class Settings(BaseSettings):
     tron_pro_api_key: str = ""  # Same as trongrid_api_key, for tronpy library
     usdt_trc20_contract: str = "TR7NHqjeKQxGTCi8q8ZY4pL8otSzgjLj6t"
     master_wallet_address: str = ""
+    trongrid_api_url: str = "https://api.trongrid.io"
+    trongrid_timeout_seconds: float = 10.0
+    trongrid_pool_size: int = 20  # Keep-alive connections to TronGrid per process
+    tron_min_confirmations: int = 20  # Confirmations after which a deposit is final
+    tron_block_height_ttl_seconds: float = 3.0  # Reuse the head block number for about one block time
+    tron_balance_concurrency: int = 8  # Parallel balanceOf calls in get_usdt_balances
+    deposit_watcher_enabled: bool = True  # Detect deposits from USDT Transfer events instead of waiting for /check
+    deposit_watcher_poll_seconds: float = 3.0  # About one Tron block
+    deposit_watcher_reload_seconds: float = 30.0  # How often open deposit addresses are re-read from the store
+    deposit_watcher_max_lag_blocks: int = 1200  # Blocks (about an hour) caught up on after a restart; older deposits are left to /check
+    deposit_watcher_cursor_file: str = "deposit_watcher.cursor"  # Next block to scan, in runtime_dir
+    verify_usdt_abi: bool = True  # Check the bundled USDT ABI against the chain once, in the background
     master_wallet_private_key: str = ""
     
+    # Startup
+    warm_up_retry_seconds: float = 10.0  # Retry interval for upstream clients that failed to initialize
+    
     # API Rate Limiting & Retry Settings
     max_retries: int = 3
     retry_delay: float = 2.0  # seconds
@@ -33,6 +58,22 @@ class Settings(BaseSettings):
     buy_margin: float = 0.05  # 5% markup when user buys from us
     sell_margin: float = 0.03  # 3% discount when user sells to us
     exchange_rate_cache_minutes: int = 5  # Cache exchange rate for 5 minutes
+    bybit_p2p_cache_minutes: int = 2  # P2P ad prices move faster than the CoinGecko aggregate
+    bybit_p2p_depth_pages: int = 5  # Pages of P2P ads fetched per side for order-size pricing
+    bybit_p2p_page_size: int = 20  # Ads per page
+    cbr_cache_minutes: int = 60  # Central Bank rate changes once a day
+    rate_fetch_deadline_seconds: float = 4.0  # Overall deadline for fetching all rate sources concurrently
+    rate_sources: str = "coingecko,bybit_p2p,cbr"  # Sources aggregated into the market rate
+    rate_outlier_tolerance: float = 0.03  # Drop source rates more than 3% away from the median
+    rate_max_age_minutes: int = 30  # Source rates older than this are left out of the market rate
+    rate_source_failure_threshold: int = 3  # Consecutive failures before a source's circuit breaker opens
+    rate_source_cooldown_seconds: float = 60.0  # How long an open breaker waits before probing again
+    quote_ttl_seconds: int = 60  # How long a quoted price is honoured
+    quote_store_max_size: int = 10000  # Live quotes kept in the database; those closest to expiry are evicted beyond this
+    rate_snapshot_file: str = "rate_snapshot.json"  # Latest rates shared by all workers, in runtime_dir
+    rate_snapshot_poll_seconds: float = 1.0  # How often non-refreshing workers check the shared snapshot
+    rate_history_file: str = "rate_history.bin"  # Ring buffer of fetched rates, in runtime_dir
+    rate_history_capacity: int = 50000  # Samples kept (about two months at one refresh every ~100s)
     
     # Rate Limiting
     api_retry_attempts: int = 3
@@ -1,6 +1,16 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from .routes import auth, transactions
+from fastapi.responses import JSONResponse
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from .config import settings
+from .routes import auth, quotes, transactions
+from .storage import get_transaction_store, uses_sheets
+from .utils.tron_wallet import get_tron_wallet
+from .utils.deposit_watcher import deposit_watcher
+from .utils.trongrid import get_async_trongrid, latency as trongrid_latency
+import asyncio
 import logging
 
 # Configure logging
@@ -15,7 +25,8 @@ logger.info("STARTING COINCONVERT API")
 logger.info("=" * 80)
 
 try:
-    from .utils.exchange_rate import get_pricing_info
+    from .utils.exchange_rate import RateUnavailableError, get_pricing_snapshot, pricing_body, pricing_cache_control, rate_refresher
+    from .utils.rate_history import get_rate_history
     has_pricing = True
     logger.info("✅ Exchange rate module loaded successfully")
 except Exception as e:
@@ -23,7 +34,53 @@ except Exception as e:
     logger.error(f"❌ Could not load exchange_rate module: {e}")
     has_pricing = False
 
-app = FastAPI(title="CoinConvert API")
+# Upstream clients warmed in the background after startup; /readyz reports on them
+warm_up_components = {
+    'storage': get_transaction_store,
+    'tron_wallet': get_tron_wallet,
+}
+if uses_sheets():
+    from .sheets_db import get_sheets_db
+    warm_up_components['sheets'] = get_sheets_db
+
+readiness = {name: 'pending' for name in warm_up_components}
+
+
+async def warm_up():
+    """Create the upstream clients concurrently, retrying the ones that fail"""
+    pending = dict(warm_up_components)
+    while pending:
+        results = await asyncio.gather(
+            *(asyncio.to_thread(factory) for factory in pending.values()),
+            return_exceptions=True
+        )
+        for name, result in zip(list(pending), results):
+            if isinstance(result, Exception):
+                readiness[name] = f"error: {result}"
+                logger.error(f"❌ Warm-up of {name} failed: {result}")
+            else:
+                readiness[name] = 'ready'
+                logger.info(f"✅ {name} ready")
+                del pending[name]
+        if pending:
+            await asyncio.sleep(settings.warm_up_retry_seconds)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Don't block startup: the worker comes up at once and /readyz flips when warmed
+    task = asyncio.create_task(warm_up())
+    if has_pricing:
+        rate_refresher.start()
+    if settings.deposit_watcher_enabled:
+        deposit_watcher.start()
+    yield
+    task.cancel()
+    if get_async_trongrid.loaded:
+        await get_async_trongrid().aclose()
+
+
+app = FastAPI(title="CoinConvert API", lifespan=lifespan)
 logger.info("FastAPI app created")
 
 app.add_middleware(
@@ -36,30 +93,98 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 @app.get("/")
 def read_root():
     return {"message": "Welcome to CoinConvert"}
 
+@app.get("/healthz")
+def healthz():
+    """Liveness: the process is up and serving requests"""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+def readyz():
+    """Readiness: storage and upstream clients have been warmed up"""
+    ready = all(state == 'ready' for state in readiness.values())
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "warming", "components": readiness}
+    )
+
+@app.get("/metrics/trongrid")
+def trongrid_metrics():
+    """Request count and latency per TronGrid endpoint since this worker started"""
+    return trongrid_latency.to_dict()
+
 # Include routers twice - with and without /api prefix to support both local dev and production proxy
 app.include_router(auth.router, prefix="/auth", tags=["auth"])
 app.include_router(transactions.router, prefix="/api", tags=["transactions"])  # For local dev (with /api)
 app.include_router(transactions.router, tags=["transactions"])  # For production proxy (strips /api)
+app.include_router(quotes.router, prefix="/api", tags=["quotes"])
+app.include_router(quotes.router, tags=["quotes"])
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    # Weak comparison (RFC 9110): "x" and W/"x" match each other
+    tags = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+    return '*' in tags or etag.removeprefix('W/') in tags
+
 
 @app.get("/pricing")
-def get_pricing():
-    """Get current exchange rates and pricing"""
+def get_pricing(request: Request):
+    """Get current exchange rates and pricing (pre-serialized; supports If-None-Match)"""
     if not has_pricing:
         return {"error": "Pricing service unavailable"}
     try:
-        return get_pricing_info()
+        snapshot = get_pricing_snapshot()
+        headers = {"ETag": snapshot.etag, "Cache-Control": pricing_cache_control(snapshot)}
+        if _etag_matches(request.headers.get("if-none-match"), snapshot.etag):
+            return Response(status_code=304, headers=headers)
+        return Response(content=pricing_body(snapshot), media_type="application/json", headers=headers)
+    except RateUnavailableError as e:
+        return JSONResponse(status_code=503, content={"error": str(e)})
     except Exception as e:
         print(f"Error in pricing endpoint: {e}")
         return {"error": str(e)}
 
 
 @app.get("/api/pricing")
-def get_pricing_api_alias():
+def get_pricing_api_alias(request: Request):
     """Alias for /pricing (frontend prefers /api/pricing)."""
-    return get_pricing()
\ No newline at end of file
+    return get_pricing(request)
+
+
+def _as_utc(value: datetime) -> datetime:
+    """Query datetimes without an offset are taken as UTC"""
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+@app.get("/pricing/history")
+def get_pricing_history(
+    start: Optional[datetime] = Query(None, alias="from", description="Start of the range (default: 24h before 'to')"),
+    end: Optional[datetime] = Query(None, alias="to", description="End of the range (default: now)"),
+    step: int = Query(3600, ge=60, description="Bucket size in seconds"),
+):
+    """Rate history downsampled to OHLC buckets"""
+    if not has_pricing:
+        return {"error": "Pricing service unavailable"}
+    end = _as_utc(end) if end else datetime.now(timezone.utc)
+    start = _as_utc(start) if start else end - timedelta(days=1)
+    try:
+        return get_rate_history(start, end, step)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/api/pricing/history")
+def get_pricing_history_api_alias(
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    step: int = Query(3600, ge=60),
+):
+    """Alias for /pricing/history"""
+    return get_pricing_history(start, end, step)
\ No newline at end of file
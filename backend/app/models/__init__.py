@@ -1,4 +1,7 @@
 from ..database import Base
 
 from .user import User
-from .transaction import Transaction
\ No newline at end of file
+from .transaction import Transaction
+from .sheets_journal import SheetsJournalEntry
+from .tron_tx import TronTxFinality
+from .quote import LockedQuote
\ No newline at end of file
@@ -0,0 +1,9 @@
+from sqlalchemy import Column, String, Text, Float
+from ..database import Base
+
+class LockedQuote(Base):
+    __tablename__ = "quotes"
+
+    quote_id = Column(String, primary_key=True)
+    payload = Column(Text, nullable=False)  # JSON quote as returned by POST /quotes
+    expires_at = Column(Float, nullable=False, index=True)  # Unix time
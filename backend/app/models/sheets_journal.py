@@ -0,0 +1,14 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime
+from sqlalchemy.sql import func
+from ..database import Base
+
+class SheetsJournalEntry(Base):
+    __tablename__ = "sheets_journal"
+
+    id = Column(Integer, primary_key=True, index=True)
+    op = Column(String, nullable=False)  # 'create' or 'update'
+    transaction_id = Column(Integer, nullable=False, index=True)
+    payload = Column(Text, nullable=False)  # JSON: full record for 'create', changed fields for 'update'
+    attempts = Column(Integer, default=0)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -0,0 +1,11 @@
+from sqlalchemy import Column, Integer, String, Boolean, DateTime
+from sqlalchemy.sql import func
+from ..database import Base
+
+class TronTxFinality(Base):
+    __tablename__ = "tron_tx_finality"
+
+    txid = Column(String, primary_key=True)
+    block_number = Column(Integer, nullable=False)
+    finalized = Column(Boolean, default=False, index=True)  # Reached tron_min_confirmations; never re-queried
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
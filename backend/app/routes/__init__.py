@@ -1 +1 @@
-from . import auth, transactions
\ No newline at end of file
+from . import auth, quotes, transactions
\ No newline at end of file
@@ -0,0 +1,90 @@
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel
+from typing import List, Optional
+from ..utils.exchange_rate import InsufficientLiquidityError, RateUnavailableError, quote_order, quote_orders
+from ..storage import get_quote_store
+import logging
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+MAX_BATCH_QUOTES = 500
+
+class QuoteRequest(BaseModel):
+    type: str  # 'sell' or 'buy'
+    amount_usdt: Optional[float] = None
+    amount_rub: Optional[float] = None
+
+class QuoteResponse(BaseModel):
+    quote_id: str
+    type: str
+    amount_usdt: float
+    amount_rub: float
+    price: float  # RUB per USDT
+    market_rate: float
+    expires_at: str
+
+@router.post("/quotes", response_model=QuoteResponse)
+def create_quote(request: QuoteRequest):
+    """Lock a price for an order; pass the quote_id to POST /transactions before it expires"""
+    try:
+        quote = quote_order(request.type, request.amount_usdt, request.amount_rub)
+    except InsufficientLiquidityError as e:
+        logger.warning(f"Cannot quote {request.type} order: {e}")
+        raise HTTPException(status_code=400, detail="Сумма слишком велика для текущей ликвидности, уменьшите сумму")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RateUnavailableError as e:
+        logger.error(f"Cannot quote {request.type} order: {e}")
+        raise HTTPException(status_code=503, detail="Курс обмена временно недоступен, попробуйте позже")
+    
+    quote = get_quote_store().create(quote)
+    logger.info(f"Issued quote {quote['quote_id']}: {quote['type']} {quote['amount_usdt']} USDT at {quote['price']} RUB")
+    return QuoteResponse(**quote)
+
+
+class BatchQuoteRequest(BaseModel):
+    sides: List[str] = ['buy', 'sell']
+    amounts_usdt: List[float] = []
+    amounts_rub: List[float] = []
+    lock: bool = False  # Also store each result as a quote usable with POST /transactions
+
+class BatchQuoteItem(BaseModel):
+    type: str
+    amount_usdt: Optional[float] = None
+    amount_rub: Optional[float] = None
+    price: Optional[float] = None
+    quote_id: Optional[str] = None
+    expires_at: Optional[str] = None
+    error: Optional[str] = None  # Set when this amount could not be priced
+
+class BatchQuoteResponse(BaseModel):
+    market_rate: Optional[float] = None
+    quotes: List[BatchQuoteItem]
+
+@router.post("/quotes/batch", response_model=BatchQuoteResponse)
+def create_quotes_batch(request: BatchQuoteRequest):
+    """Price every side for every amount in one call, against a single market rate"""
+    orders = [(side, amount, None) for side in request.sides for amount in request.amounts_usdt]
+    orders += [(side, None, amount) for side in request.sides for amount in request.amounts_rub]
+    if not orders:
+        raise HTTPException(status_code=400, detail="amounts_usdt or amounts_rub is required")
+    if len(orders) > MAX_BATCH_QUOTES:
+        raise HTTPException(status_code=400, detail=f"Too many quotes in one batch (max {MAX_BATCH_QUOTES})")
+    
+    try:
+        quotes = quote_orders(orders)
+    except RateUnavailableError as e:
+        logger.error(f"Cannot quote batch: {e}")
+        raise HTTPException(status_code=503, detail="Курс обмена временно недоступен, попробуйте позже")
+    
+    if request.lock:
+        # One transaction for the whole batch
+        locked = iter(get_quote_store().create_many([quote for quote in quotes if 'error' not in quote]))
+        quotes = [quote if 'error' in quote else next(locked) for quote in quotes]
+    market_rate = next((quote['market_rate'] for quote in quotes if 'market_rate' in quote), None)
+    return BatchQuoteResponse(
+        market_rate=market_rate,
+        quotes=[BatchQuoteItem(**{key: value for key, value in quote.items() if key != 'market_rate'}) for quote in quotes]
+    )
@@ -1,12 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from pydantic import BaseModel
 from typing import Optional
+from datetime import datetime, timezone
 from decimal import Decimal
 import re
-from ..utils.tron_wallet import tron_wallet
+from ..config import settings
+from ..utils.tron_wallet import get_tron_wallet
 from ..utils.telegram_notification import telegram_notifier
-from ..utils.exchange_rate import calculate_sell_price, calculate_buy_price
-from ..sheets_db import sheets_db
+from ..utils.exchange_rate import InsufficientLiquidityError, RateUnavailableError, calculate_sell_price, calculate_buy_price
+from ..utils.deposit_watcher import deposit_watcher
+from ..storage import TransactionStore, get_quote_store, get_transaction_store
 import uuid
 import logging
 
@@ -23,6 +26,7 @@ class TransactionCreate(BaseModel):
     bank_name: Optional[str] = None
     card_number: Optional[str] = None
     usdt_address: Optional[str] = None
+    quote_id: Optional[str] = None  # From POST /quotes; locks amounts and price
 
 class TransactionResponse(BaseModel):
     id: int
@@ -37,7 +41,7 @@ class TransactionResponse(BaseModel):
     usdt_address: Optional[str] = None
 
 @router.post("/transactions", response_model=TransactionResponse)
-def create_transaction(transaction: TransactionCreate):
+def create_transaction(transaction: TransactionCreate, transaction_store: TransactionStore = Depends(get_transaction_store)):
     logger.info("=" * 80)
     logger.info("Creating new transaction")
     logger.info(f"Transaction type: {transaction.type}")
@@ -68,25 +72,45 @@ def create_transaction(transaction: TransactionCreate):
     amount_usdt = transaction.amount_usdt
     amount_rub = transaction.amount_rub
     
-    if transaction.type == "sell":
-        # For sell transactions, calculate RUB amount from USDT
-        if amount_usdt and not amount_rub:
-            sell_price = calculate_sell_price()  # Price we pay per USDT
-            amount_rub = float(Decimal(str(amount_usdt)) * sell_price)
-            logger.info(f"Calculated RUB amount for sell: {amount_usdt} USDT = {amount_rub} RUB (rate: {sell_price})")
-    elif transaction.type == "buy":
-        # For buy transactions, calculate USDT amount from RUB
-        if amount_rub and not amount_usdt:
-            buy_price = calculate_buy_price()  # Price user pays per USDT
-            amount_usdt = float(Decimal(str(amount_rub)) / buy_price)
-            logger.info(f"Calculated USDT amount for buy: {amount_rub} RUB = {amount_usdt} USDT (rate: {buy_price})")
+    if transaction.quote_id:
+        # Locked quote: the amounts were priced when it was issued
+        # Check the type before claiming, so a mismatched request doesn't burn the quote
+        quote = get_quote_store().get(transaction.quote_id)
+        if quote is not None and quote['type'] == transaction.type:
+            quote = get_quote_store().take(transaction.quote_id)
+        if quote is None or quote['type'] != transaction.type:
+            logger.warning(f"Quote {transaction.quote_id} is unknown, expired or for another order type")
+            raise HTTPException(status_code=400, detail="Котировка не найдена или устарела, запросите новую")
+        amount_usdt = quote['amount_usdt']
+        amount_rub = quote['amount_rub']
+        logger.info(f"Using quote {transaction.quote_id}: {amount_usdt} USDT = {amount_rub} RUB (rate: {quote['price']})")
+    else:
+        try:
+            if transaction.type == "sell":
+                # For sell transactions, calculate RUB amount from USDT
+                if amount_usdt and not amount_rub:
+                    sell_price = calculate_sell_price(amount_usdt=amount_usdt)  # Price we pay per USDT
+                    amount_rub = float(Decimal(str(amount_usdt)) * sell_price)
+                    logger.info(f"Calculated RUB amount for sell: {amount_usdt} USDT = {amount_rub} RUB (rate: {sell_price})")
+            elif transaction.type == "buy":
+                # For buy transactions, calculate USDT amount from RUB
+                if amount_rub and not amount_usdt:
+                    buy_price = calculate_buy_price(amount_rub=amount_rub)  # Price user pays per USDT
+                    amount_usdt = float(Decimal(str(amount_rub)) / buy_price)
+                    logger.info(f"Calculated USDT amount for buy: {amount_rub} RUB = {amount_usdt} USDT (rate: {buy_price})")
+        except InsufficientLiquidityError as e:
+            logger.warning(f"Cannot price transaction: {e}")
+            raise HTTPException(status_code=400, detail="Сумма слишком велика для текущей ликвидности, уменьшите сумму")
+        except RateUnavailableError as e:
+            logger.error(f"Cannot price transaction: {e}")
+            raise HTTPException(status_code=503, detail="Курс обмена временно недоступен, попробуйте позже")
     
     # Generate deposit address for sell transactions
     deposit_info = None
     if transaction.type == "sell":
         logger.info("Generating deposit address for sell transaction...")
         try:
-            deposit_info = tron_wallet.generate_deposit_address()
+            deposit_info = get_tron_wallet().generate_deposit_address()
             logger.info(f"Generated deposit address: {deposit_info['address']}")
         except Exception as e:
             logger.error(f"Error generating deposit address: {e}")
@@ -111,10 +135,13 @@ def create_transaction(transaction: TransactionCreate):
             'status': 'pending'
         }
         
-        logger.info("Saving transaction to Google Sheets...")
-        result = sheets_db.create_transaction(transaction_data)
+        logger.info("Saving transaction...")
+        result = transaction_store.create_transaction(transaction_data)
         logger.info(f"Transaction saved successfully with ID: {result['id']}")
         
+        if result.get('type') == 'sell':
+            deposit_watcher.watch(result)
+        
         # Send Telegram notification
         logger.info("Sending Telegram notification...")
         telegram_notifier.send_transaction_notification(result)
@@ -136,21 +163,52 @@ def create_transaction(transaction: TransactionCreate):
         logger.exception("Full traceback:")
         raise HTTPException(status_code=500, detail=f"Failed to create transaction: {str(e)}")
 
+def _as_utc_naive(value: Optional[datetime]) -> Optional[datetime]:
+    """Stored timestamps are naive UTC; normalize aware query parameters to match"""
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
 @router.get("/transactions", response_model=list[TransactionResponse])
-def get_transactions():
-    """Get all transactions - no auth required for now"""
+def get_transactions(
+    response: Response,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[int] = Query(None, description="Return transactions older than this ID (from X-Next-Cursor)"),
+    offset: int = Query(0, ge=0),
+    status: Optional[str] = None,
+    type: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    transaction_store: TransactionStore = Depends(get_transaction_store),
+):
+    """List transactions newest first - no auth required for now.
+    
+    When more results exist, the ID to pass as ``cursor`` for the next page is
+    returned in the X-Next-Cursor header.
+    """
     try:
-        transactions = sheets_db.get_all_transactions()
+        transactions = transaction_store.list_transactions(
+            status=status,
+            type=type,
+            since=_as_utc_naive(since),
+            until=_as_utc_naive(until),
+            cursor=cursor,
+            offset=offset,
+            limit=limit + 1
+        )
+        if len(transactions) > limit:
+            transactions = transactions[:limit]
+            response.headers['X-Next-Cursor'] = str(transactions[-1]['id'])
         return transactions
     except Exception as e:
         logger.error(f"Error getting transactions: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/transactions/{transaction_hash}")
-def get_transaction_by_hash(transaction_hash: str):
+def get_transaction_by_hash(transaction_hash: str, transaction_store: TransactionStore = Depends(get_transaction_store)):
     """Get transaction details by hash - no auth required"""
     try:
-        tx = sheets_db.get_transaction_by_hash(transaction_hash)
+        tx = transaction_store.get_transaction_by_hash(transaction_hash)
         if not tx:
             raise HTTPException(status_code=404, detail="Transaction not found")
         return tx
@@ -161,10 +219,10 @@ def get_transaction_by_hash(transaction_hash: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/transactions/{transaction_hash}/check")
-def check_transaction_status(transaction_hash: str):
+def check_transaction_status(transaction_hash: str, transaction_store: TransactionStore = Depends(get_transaction_store)):
     """Manually check transaction status on blockchain"""
     try:
-        tx = sheets_db.get_transaction_by_hash(transaction_hash)
+        tx = transaction_store.get_transaction_by_hash(transaction_hash)
         if not tx:
             raise HTTPException(status_code=404, detail="Transaction not found")
         
@@ -179,7 +237,7 @@ def check_transaction_status(transaction_hash: str):
             current_status = tx.get('status', 'pending')
             check_confirmations = (current_status == 'confirming')
             
-            result = tron_wallet.check_incoming_transaction(
+            result = get_tron_wallet().check_incoming_transaction(
                 tx['deposit_address'],
                 Decimal(str(tx['amount_usdt'])),
                 check_confirmations=check_confirmations
@@ -188,7 +246,7 @@ def check_transaction_status(transaction_hash: str):
             if result.get('received'):
                 if current_status == 'pending':
                     # Funds received, move to confirming
-                    sheets_db.update_transaction(tx['id'], {'status': 'confirming'})
+                    transaction_store.update_transaction(tx['id'], {'status': 'confirming'})
                     logger.info(f"Transaction {transaction_hash} moved to confirming status")
                     return {
                         'status': 'confirming', 
@@ -197,8 +255,8 @@ def check_transaction_status(transaction_hash: str):
                         'confirmations': result.get('min_confirmations', 0)
                     }
                 elif current_status == 'confirming' and result.get('confirmed'):
-                    # Funds received AND confirmed (20+ confirmations)
-                    sheets_db.update_transaction(tx['id'], {'status': 'completed'})
+                    # Funds received AND confirmed (tron_min_confirmations+)
+                    transaction_store.update_transaction(tx['id'], {'status': 'completed'})
                     logger.info(f"Transaction {transaction_hash} completed with {result.get('min_confirmations', 0)} confirmations")
                     return {
                         'status': 'completed', 
@@ -211,7 +269,7 @@ def check_transaction_status(transaction_hash: str):
                     min_confs = result.get('min_confirmations', 0)
                     return {
                         'status': 'confirming',
-                        'message': f'Waiting for confirmations ({min_confs}/20)...',
+                        'message': f'Waiting for confirmations ({min_confs}/{settings.tron_min_confirmations})...',
                         'balance': str(result.get('amount', 0)),
                         'confirmations': min_confs
                     }
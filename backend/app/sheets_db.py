@@ -1,19 +1,334 @@
 import gspread
+from gspread.utils import numericise, rowcol_to_a1
 from google.oauth2.service_account import Credentials
 from datetime import datetime
 import logging
+import re
+import threading
+import time
+from functools import wraps
 from typing import List, Dict, Optional
 from .config import settings
+from .utils.lazy import LazySingleton
+from .utils.quota_governor import QuotaGovernor, PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW
 
 logger = logging.getLogger(__name__)
 
+TRANSACTION_HEADERS = [
+    'id', 'hash', 'user_id', 'type', 'amount_usdt', 'amount_rub',
+    'payment_method', 'phone_number', 'bank_name', 'card_number',
+    'usdt_address', 'deposit_address', 'deposit_private_key',
+    'tron_txid', 'status', 'created_at', 'updated_at'
+]
+
+
+class GovernedWorksheet:
+    """Proxy for gspread.Worksheet that draws every API call from the shared quota.
+
+    Calls wait for a token instead of failing, and a 429 from Google empties
+    the local bucket and retries the call once it has refilled.
+    """
+    CALLS = {
+        'append_row': ('write', PRIORITY_HIGH),
+        'append_rows': ('write', PRIORITY_HIGH),
+        'batch_update': ('write', PRIORITY_HIGH),
+        'update_cell': ('write', PRIORITY_HIGH),
+        'row_values': ('read', PRIORITY_NORMAL),
+        'col_values': ('read', PRIORITY_NORMAL),
+        'batch_get': ('read', PRIORITY_NORMAL),
+        'get_all_records': ('read', PRIORITY_LOW),
+        'get_all_values': ('read', PRIORITY_LOW),
+    }
+
+    def __init__(self, worksheet, governor: QuotaGovernor):
+        self._worksheet = worksheet
+        self._governor = governor
+
+    def __getattr__(self, name):
+        attr = getattr(self._worksheet, name)
+        if name not in self.CALLS:
+            return attr
+        kind, priority = self.CALLS[name]
+
+        @wraps(attr)
+        def call(*args, **kwargs):
+            for attempt in range(settings.max_retries):
+                self._governor.acquire(kind, priority)
+                try:
+                    return attr(*args, **kwargs)
+                except gspread.exceptions.APIError as e:
+                    status = getattr(getattr(e, 'response', None), 'status_code', None)
+                    if status != 429 or attempt == settings.max_retries - 1:
+                        raise
+                    logger.warning(f"Sheets {kind} quota exceeded in {name}, waiting for quota "
+                                   f"(attempt {attempt + 1}/{settings.max_retries})")
+                    self._governor.drain(kind)
+        return call
+
+
+def _create_governor() -> Optional[QuotaGovernor]:
+    if settings.sheets_read_quota_per_minute <= 0 or settings.sheets_write_quota_per_minute <= 0:
+        return None
+    return QuotaGovernor("sheets", {
+        'read': settings.sheets_read_quota_per_minute,
+        'write': settings.sheets_write_quota_per_minute,
+    })
+
+
+class TransactionIndex:
+    """In-memory copy of the Transactions worksheet, indexed for lookups.
+
+    Records are kept in the same shape ``get_all_records()`` returns them, so
+    callers see no difference between a cached and a fresh read. Writes made
+    while a reload or delta merge is in flight are replayed on top of it.
+    """
+    UNIQUE_FIELDS = ('id', 'hash')
+    MULTI_FIELDS = ('user_id', 'status', 'deposit_address')
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._records: Dict[str, Dict] = {}
+        self._rows: Dict[str, int] = {}
+        self._unique: Dict[str, Dict[str, Dict]] = {}
+        self._multi: Dict[str, Dict[str, Dict[str, Dict]]] = {}
+        self._generation = 0
+        self._writes = []
+        self._reloading = 0
+        self._ids_by_row: Dict[int, str] = {}
+        self.watermark = ''
+        self.loaded_at = None
+        self._reset()
+
+    @staticmethod
+    def _key(value) -> str:
+        return str(value if value is not None else '').strip()
+
+    def _reset(self):
+        self._records = {}
+        self._rows = {}
+        self._ids_by_row = {}
+        self.watermark = ''
+        self._unique = {field: {} for field in self.UNIQUE_FIELDS}
+        self._multi = {field: {} for field in self.MULTI_FIELDS}
+
+    def _index(self, record: Dict):
+        record_id = self._key(record.get('id'))
+        for field in self.UNIQUE_FIELDS:
+            key = self._key(record.get(field))
+            if key:
+                self._unique[field][key] = record
+        for field in self.MULTI_FIELDS:
+            key = self._key(record.get(field))
+            if key:
+                self._multi[field].setdefault(key, {})[record_id] = record
+
+    def _unindex(self, record: Dict):
+        record_id = self._key(record.get('id'))
+        for field in self.UNIQUE_FIELDS:
+            key = self._key(record.get(field))
+            if self._unique[field].get(key) is record:
+                del self._unique[field][key]
+        for field in self.MULTI_FIELDS:
+            bucket = self._multi[field].get(self._key(record.get(field)))
+            if bucket and bucket.get(record_id) is record:
+                del bucket[record_id]
+
+    def _add(self, record: Dict, row_num: int):
+        record_id = self._key(record.get('id'))
+        if not record_id:
+            return
+        existing = self._records.get(record_id)
+        if existing is not None:
+            self._unindex(existing)
+        self._records[record_id] = record
+        self._rows[record_id] = row_num
+        self._ids_by_row[row_num] = record_id
+        self._index(record)
+        self.watermark = max(self.watermark, self._key(record.get('updated_at')))
+
+    def _update(self, transaction_id, updates: Dict) -> bool:
+        record = self._records.get(self._key(transaction_id))
+        if record is None:
+            return False
+        self._unindex(record)
+        record.update(updates)
+        self._index(record)
+        self.watermark = max(self.watermark, self._key(record.get('updated_at')))
+        return True
+
+    def _log_write(self, op: str, *args):
+        self._generation += 1
+        if self._reloading:
+            self._writes.append((self._generation, op, args))
+
+    def begin_reload(self) -> int:
+        """Mark the start of a full reload; returns a token for finish_reload"""
+        with self._lock:
+            self._reloading += 1
+            return self._generation
+
+    def _replay_writes(self, token: int):
+        for generation, op, args in self._writes:
+            if generation > token:
+                getattr(self, op)(*args)
+        self.abort_reload()
+
+    def finish_reload(self, records: List[Dict], token: int):
+        """Replace the snapshot with freshly fetched records"""
+        with self._lock:
+            self._reset()
+            # Header is row 1, so the first record lives in row 2
+            for offset, record in enumerate(records):
+                self._add(dict(record), offset + 2)
+            self._replay_writes(token)
+            self.loaded_at = time.monotonic()
+
+    def finish_merge(self, rows: Dict[int, Dict], token: int):
+        """Merge freshly fetched rows (row number -> record) into the snapshot"""
+        with self._lock:
+            for row_num, record in sorted(rows.items()):
+                self._add(dict(record), row_num)
+            self._replay_writes(token)
+
+    def abort_reload(self):
+        with self._lock:
+            self._reloading -= 1
+            if not self._reloading:
+                self._writes = []
+
+    def add(self, record: Dict, row_num: int):
+        with self._lock:
+            record = dict(record)
+            self._add(record, row_num)
+            self._log_write('_add', dict(record), row_num)
+
+    def update(self, transaction_id, updates: Dict) -> bool:
+        with self._lock:
+            updated = self._update(transaction_id, updates)
+            self._log_write('_update', transaction_id, dict(updates))
+            return updated
+
+    def get(self, field: str, value) -> Optional[Dict]:
+        """Get a copy of the record whose unique ``field`` equals ``value``"""
+        with self._lock:
+            record = self._unique[field].get(self._key(value))
+            return dict(record) if record is not None else None
+
+    def find(self, field: str, value) -> List[Dict]:
+        """Get copies of all records whose ``field`` equals ``value``, in sheet order"""
+        with self._lock:
+            bucket = self._multi[field].get(self._key(value), {})
+            records = sorted(bucket.values(), key=lambda r: self._rows[self._key(r.get('id'))])
+            return [dict(r) for r in records]
+
+    def row_of(self, transaction_id) -> Optional[int]:
+        with self._lock:
+            return self._rows.get(self._key(transaction_id))
+
+    def updated_at_of_row(self, row_num: int) -> Optional[str]:
+        """Cached updated_at of the record in ``row_num``, if that row is known"""
+        with self._lock:
+            record = self._records.get(self._ids_by_row.get(row_num))
+            return self._key(record.get('updated_at')) if record is not None else None
+
+    def newest_first(self, status: Optional[str] = None) -> List[Dict]:
+        """Records (optionally only those with ``status``) ordered by descending ID, uncopied"""
+        with self._lock:
+            if status:
+                records = list(self._multi['status'].get(self._key(status), {}).values())
+            else:
+                records = list(self._records.values())
+        return sorted(records, key=lambda r: _max_numeric([r.get('id')]), reverse=True)
+
+    def last_row(self) -> int:
+        with self._lock:
+            return max(self._ids_by_row, default=1)
+
+    def all(self) -> List[Dict]:
+        with self._lock:
+            records = sorted(self._records.values(), key=lambda r: self._rows[self._key(r.get('id'))])
+            return [dict(r) for r in records]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._records)
+
+
+class IdAllocator:
+    """Hands out sequential IDs without re-reading the sheet.
+
+    The last used ID is looked up once via ``seed`` on first use; after that
+    each allocation is a counter increment under a lock, so concurrent
+    requests never receive the same ID.
+    """
+    def __init__(self, seed):
+        self._seed = seed
+        self._last_id = None
+        self._lock = threading.Lock()
+
+    def next_id(self) -> int:
+        with self._lock:
+            if self._last_id is None:
+                self._last_id = self._seed()
+            self._last_id += 1
+            return self._last_id
+
+    def observe(self, used_id) -> None:
+        """Make sure IDs assigned elsewhere are never handed out again"""
+        try:
+            used_id = int(used_id)
+        except (TypeError, ValueError):
+            return
+        with self._lock:
+            if self._last_id is not None and used_id > self._last_id:
+                self._last_id = used_id
+
+
+def _max_numeric(values) -> int:
+    ids = [int(v) for v in values if str(v).strip().isdigit()]
+    return max(ids, default=0)
+
+
+def _cell(value) -> str:
+    """Render a value for the sheet, leaving missing values blank"""
+    return '' if value is None else str(value)
+
+
+def _column_letter(col: int) -> str:
+    return re.sub(r'\d', '', rowcol_to_a1(1, col))
+
+
+def _record_from_values(headers: List[str], values: List) -> Dict:
+    """Turn raw row values into a record shaped like get_all_records() output"""
+    values = list(values) + [''] * (len(headers) - len(values))
+    return {header: numericise(value) for header, value in zip(headers, values)}
+
+
+def _appended_row(response) -> Optional[int]:
+    """Extract the row number from an append response ('Sheet!A5:Q5' -> 5)"""
+    try:
+        updated_range = response['updates']['updatedRange']
+    except (KeyError, TypeError):
+        return None
+    match = re.search(r'![A-Z]+(\d+)', updated_range)
+    return int(match.group(1)) if match else None
+
+
 class GoogleSheetsDB:
     def __init__(self):
         self.client = None
         self.sheet = None
         self.transactions_worksheet = None
         self.users_worksheet = None
+        self.transactions = TransactionIndex()
+        self._transaction_columns = None
+        self._transaction_ids = IdAllocator(self._seed_transaction_id)
+        self._user_ids = IdAllocator(lambda: _max_numeric(self.users_worksheet.col_values(1)[1:]))
+        self._reconcile_thread = None
+        self._last_full_reconcile = None
         self._init_connection()
+        self.reconcile()
+        self._start_reconciler()
     
     def _init_connection(self):
         """Initialize connection to Google Sheets"""
@@ -35,6 +350,11 @@ class GoogleSheetsDB:
             
             # Get or create worksheets
             self._setup_worksheets()
+            
+            governor = _create_governor()
+            if governor is not None:
+                self.transactions_worksheet = GovernedWorksheet(self.transactions_worksheet, governor)
+                self.users_worksheet = GovernedWorksheet(self.users_worksheet, governor)
             logger.info("Successfully connected to Google Sheets")
             
         except Exception as e:
@@ -52,13 +372,8 @@ class GoogleSheetsDB:
                 cols=20
             )
             # Add headers
-            headers = [
-                'id', 'hash', 'user_id', 'type', 'amount_usdt', 'amount_rub',
-                'payment_method', 'phone_number', 'bank_name', 'card_number',
-                'usdt_address', 'deposit_address', 'deposit_private_key',
-                'tron_txid', 'status', 'created_at', 'updated_at'
-            ]
-            self.transactions_worksheet.append_row(headers)
+            self.transactions_worksheet.append_row(TRANSACTION_HEADERS)
+            self._transaction_columns = {header: idx + 1 for idx, header in enumerate(TRANSACTION_HEADERS)}
             logger.info("Created Transactions worksheet")
         
         try:
@@ -74,128 +389,272 @@ class GoogleSheetsDB:
             self.users_worksheet.append_row(headers)
             logger.info("Created Users worksheet")
     
-    def create_transaction(self, transaction_data: Dict) -> Dict:
-        """Create a new transaction"""
+    def reconcile(self) -> bool:
+        """Reload the transaction cache from the sheet to pick up manual edits"""
+        token = self.transactions.begin_reload()
         try:
-            # Get next ID
-            all_records = self.transactions_worksheet.get_all_values()
-            next_id = len(all_records)  # Header is row 1, so this gives us the next ID
+            records = self.transactions_worksheet.get_all_records()
+        except Exception as e:
+            self.transactions.abort_reload()
+            logger.error(f"Error reconciling transaction cache: {e}")
+            return False
+        self.transactions.finish_reload(records, token)
+        self._transaction_ids.observe(_max_numeric(r.get('id') for r in records))
+        self._last_full_reconcile = time.monotonic()
+        logger.info(f"Transaction cache reconciled: {len(records)} records")
+        return True
+    
+    def sync(self) -> bool:
+        """Bring the transaction cache up to date, downloading only what changed.
+        
+        Fetches the rows appended after the last known row plus the updated_at
+        column in one request, then re-reads just the rows whose updated_at
+        moved past the watermark. Edits that do not touch updated_at are picked
+        up by the full reconcile every sheets_full_reconcile_seconds.
+        """
+        full_due = (
+            self._last_full_reconcile is None
+            or time.monotonic() - self._last_full_reconcile >= settings.sheets_full_reconcile_seconds
+        )
+        if full_due:
+            return self.reconcile()
+        
+        token = self.transactions.begin_reload()
+        try:
+            columns = self._get_transaction_columns()
+            headers = sorted(columns, key=columns.get)
+            last_col = _column_letter(max(columns.values()))
+            updated_col = _column_letter(columns['updated_at'])
+            last_row = self.transactions.last_row()
+            watermark = self.transactions.watermark
             
-            # Prepare row data - ensure all values are strings or numbers
-            now = datetime.utcnow().isoformat()
-            row = [
-                str(next_id),
-                str(transaction_data.get('hash', '')),
-                str(transaction_data.get('user_id', '')),
-                str(transaction_data.get('type', '')),
-                str(transaction_data.get('amount_usdt', '')),
-                str(transaction_data.get('amount_rub', '')),
-                str(transaction_data.get('payment_method', '')),
-                str(transaction_data.get('phone_number', '')),
-                str(transaction_data.get('bank_name', '')),
-                str(transaction_data.get('card_number', '')),
-                str(transaction_data.get('usdt_address', '')),
-                str(transaction_data.get('deposit_address', '')),
-                str(transaction_data.get('deposit_private_key', '')),
-                str(transaction_data.get('tron_txid', '')),
-                str(transaction_data.get('status', 'pending')),
-                str(now),
-                str(now)
-            ]
+            ranges = [f"A{last_row + 1}:{last_col}"]
+            if last_row >= 2:
+                ranges.append(f"{updated_col}2:{updated_col}{last_row}")
+            tail, *rest = self.transactions_worksheet.batch_get(ranges)
+            updated_column = rest[0] if rest else []
             
-            # Append row with explicit value_input_option
-            self.transactions_worksheet.append_row(row, value_input_option='RAW')
-            logger.info(f"Created transaction with ID: {next_id}, row data: {len(row)} columns")
+            fetched = {}
+            for offset, values in enumerate(tail):
+                if any(values):
+                    fetched[last_row + 1 + offset] = _record_from_values(headers, values)
             
-            # Return transaction with ID
-            transaction_data['id'] = next_id
-            transaction_data['created_at'] = now
-            transaction_data['updated_at'] = now
-            return transaction_data
+            changed_rows = []
+            for offset, values in enumerate(updated_column):
+                row_num = offset + 2
+                updated_at = str(values[0]).strip() if values else ''
+                if updated_at > watermark and updated_at != self.transactions.updated_at_of_row(row_num):
+                    changed_rows.append(row_num)
             
+            if changed_rows:
+                changed = self.transactions_worksheet.batch_get(
+                    [f"A{row_num}:{last_col}{row_num}" for row_num in changed_rows]
+                )
+                for row_num, values in zip(changed_rows, changed):
+                    if values and any(values[0]):
+                        fetched[row_num] = _record_from_values(headers, values[0])
+        except Exception as e:
+            self.transactions.abort_reload()
+            logger.error(f"Error syncing transaction cache: {e}")
+            return False
+        
+        self.transactions.finish_merge(fetched, token)
+        self._transaction_ids.observe(_max_numeric(r.get('id') for r in fetched.values()))
+        if fetched:
+            logger.info(f"Transaction cache synced: {len(fetched)} new or changed rows")
+        return True
+    
+    def _start_reconciler(self):
+        """Start the background thread that periodically syncs the cache"""
+        if settings.sheets_reconcile_seconds <= 0 or self._reconcile_thread is not None:
+            return
+        
+        def loop():
+            while True:
+                time.sleep(settings.sheets_reconcile_seconds)
+                self.sync()
+        
+        self._reconcile_thread = threading.Thread(target=loop, name="sheets-reconcile", daemon=True)
+        self._reconcile_thread.start()
+    
+    def _seed_transaction_id(self) -> int:
+        """Last used transaction ID, from the cache if it has been loaded"""
+        if self.transactions.loaded_at is not None:
+            return max(_max_numeric(r.get('id') for r in self.transactions.all()), len(self.transactions))
+        return _max_numeric(self.transactions_worksheet.col_values(1)[1:])
+    
+    def _build_transaction_row(self, transaction_data: Dict) -> List[str]:
+        """Assign an ID if needed and lay the transaction out in sheet column order"""
+        # Mirrored writes arrive with the ID the primary store assigned
+        if transaction_data.get('id'):
+            next_id = int(transaction_data['id'])
+            self._transaction_ids.observe(next_id)
+        else:
+            next_id = self._transaction_ids.next_id()
+        
+        # Prepare row data - ensure all values are strings or numbers
+        now = transaction_data.get('created_at') or datetime.utcnow().isoformat()
+        return [
+            str(next_id),
+            _cell(transaction_data.get('hash')),
+            _cell(transaction_data.get('user_id')),
+            _cell(transaction_data.get('type')),
+            _cell(transaction_data.get('amount_usdt')),
+            _cell(transaction_data.get('amount_rub')),
+            _cell(transaction_data.get('payment_method')),
+            _cell(transaction_data.get('phone_number')),
+            _cell(transaction_data.get('bank_name')),
+            _cell(transaction_data.get('card_number')),
+            _cell(transaction_data.get('usdt_address')),
+            _cell(transaction_data.get('deposit_address')),
+            _cell(transaction_data.get('deposit_private_key')),
+            _cell(transaction_data.get('tron_txid')),
+            _cell(transaction_data.get('status') or 'pending'),
+            str(now),
+            str(transaction_data.get('updated_at') or now)
+        ]
+    
+    def create_transaction(self, transaction_data: Dict) -> Dict:
+        """Create a new transaction"""
+        try:
+            created = self.append_transactions([transaction_data])[0]
+            transaction_data.update(id=created['id'], created_at=created['created_at'], updated_at=created['updated_at'])
+            return transaction_data
         except Exception as e:
             logger.error(f"Error creating transaction: {e}")
             raise
     
+    def append_transactions(self, transactions: List[Dict]) -> List[Dict]:
+        """Append many transactions with a single append_rows call"""
+        if not transactions:
+            return []
+        rows = [self._build_transaction_row(transaction_data) for transaction_data in transactions]
+        
+        # Append rows with explicit value_input_option
+        response = self.transactions_worksheet.append_rows(rows, value_input_option='RAW')
+        first_row = _appended_row(response)
+        
+        records = []
+        for offset, row in enumerate(rows):
+            row_num = first_row + offset if first_row else int(row[0]) + 1
+            # Keep the cache in the shape get_all_records() would return
+            record = _record_from_values(TRANSACTION_HEADERS, row)
+            self.transactions.add(record, row_num)
+            records.append(record)
+        
+        logger.info(f"Appended transactions {[row[0] for row in rows]} starting at row {first_row}")
+        return records
+    
     def get_transaction_by_hash(self, hash: str) -> Optional[Dict]:
         """Get transaction by hash"""
-        try:
-            logger.info(f"Searching for transaction with hash: {hash}")
-            records = self.transactions_worksheet.get_all_records()
-            logger.info(f"Found {len(records)} total transactions")
-            
-            for record in records:
-                record_hash = record.get('hash', '').strip()
-                if record_hash == hash:
-                    logger.info(f"Transaction found: ID={record.get('id')}")
-                    return record
-            
+        record = self.transactions.get('hash', hash)
+        if record is None:
             logger.warning(f"Transaction not found for hash: {hash}")
-            # Log first few hashes for debugging
-            if records:
-                sample_hashes = [r.get('hash', '')[:20] for r in records[:3]]
-                logger.info(f"Sample hashes in DB: {sample_hashes}")
-            return None
-        except Exception as e:
-            logger.error(f"Error getting transaction by hash: {e}")
-            logger.exception("Full traceback:")
-            return None
+        return record
+    
+    def get_transaction_by_id(self, transaction_id: int) -> Optional[Dict]:
+        """Get transaction by ID"""
+        return self.transactions.get('id', transaction_id)
+    
+    def get_transaction_by_deposit_address(self, address: str) -> Optional[Dict]:
+        """Get the transaction a deposit address was generated for"""
+        records = self.transactions.find('deposit_address', address)
+        return records[0] if records else None
     
     def get_transactions_by_user(self, user_id: int) -> List[Dict]:
         """Get all transactions for a user"""
-        try:
-            records = self.transactions_worksheet.get_all_records()
-            user_transactions = [r for r in records if r.get('user_id') == str(user_id)]
-            return user_transactions
-        except Exception as e:
-            logger.error(f"Error getting user transactions: {e}")
-            return []
+        return self.transactions.find('user_id', user_id)
+    
+    def get_transactions_by_status(self, status: str) -> List[Dict]:
+        """Get all transactions with the given status"""
+        return self.transactions.find('status', status)
     
     def get_all_transactions(self) -> List[Dict]:
         """Get all transactions"""
-        try:
-            return self.transactions_worksheet.get_all_records()
-        except Exception as e:
-            logger.error(f"Error getting all transactions: {e}")
-            return []
+        return self.transactions.all()
+    
+    def _get_transaction_columns(self) -> Dict[str, int]:
+        """Get the header -> column number map, read from the sheet once"""
+        if self._transaction_columns is None:
+            headers = self.transactions_worksheet.row_values(1)
+            self._transaction_columns = {header: idx + 1 for idx, header in enumerate(headers) if header}
+        return self._transaction_columns
+    
+    def list_transactions(
+        self,
+        status: Optional[str] = None,
+        type: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        cursor: Optional[int] = None,
+        offset: int = 0,
+        limit: int = 50
+    ) -> List[Dict]:
+        """List transactions newest first, filtered in memory"""
+        since = since.isoformat() if since else None
+        until = until.isoformat() if until else None
+        page = []
+        skipped = 0
+        for record in self.transactions.newest_first(status):
+            if cursor and _max_numeric([record.get('id')]) >= int(cursor):
+                continue
+            if type and record.get('type') != type:
+                continue
+            created_at = str(record.get('created_at', ''))
+            if (since and created_at < since) or (until and created_at >= until):
+                continue
+            if skipped < offset:
+                skipped += 1
+                continue
+            page.append(dict(record))
+            if len(page) >= limit:
+                break
+        return page
     
     def update_transaction(self, transaction_id: int, updates: Dict) -> bool:
         """Update a transaction"""
+        return self.update_transactions({transaction_id: updates})
+    
+    def update_transactions(self, updates_by_id: Dict[int, Dict]) -> bool:
+        """Update many transactions with a single batch_update call"""
+        if not updates_by_id:
+            return True
         try:
-            # Find the row (add 2 because: 1 for header, 1 for 0-indexing)
-            row_num = transaction_id + 1
+            columns = self._get_transaction_columns()
+            now = datetime.utcnow().isoformat()
+            data = []
+            cached_updates = {}
             
-            # Get current row
-            row = self.transactions_worksheet.row_values(row_num)
-            headers = self.transactions_worksheet.row_values(1)
+            for transaction_id, updates in updates_by_id.items():
+                # Find the row (add 2 because: 1 for header, 1 for 0-indexing)
+                row_num = self.transactions.row_of(transaction_id) or int(transaction_id) + 1
+                
+                cached = {key: value for key, value in updates.items() if key in columns}
+                cached['updated_at'] = now
+                for key, value in cached.items():
+                    data.append({
+                        'range': rowcol_to_a1(row_num, columns[key]),
+                        'values': [[value]]
+                    })
+                cached_updates[transaction_id] = cached
             
-            # Update fields
-            for key, value in updates.items():
-                if key in headers:
-                    col_idx = headers.index(key) + 1
-                    self.transactions_worksheet.update_cell(row_num, col_idx, value)
-            
-            # Update timestamp
-            updated_at_col = headers.index('updated_at') + 1
-            self.transactions_worksheet.update_cell(
-                row_num,
-                updated_at_col,
-                datetime.utcnow().isoformat()
-            )
+            self.transactions_worksheet.batch_update(data, value_input_option='RAW')
+            
+            for transaction_id, cached in cached_updates.items():
+                self.transactions.update(transaction_id, cached)
             
-            logger.info(f"Updated transaction {transaction_id}")
+            logger.info(f"Updated transactions {list(updates_by_id)} in one batch ({len(data)} cells)")
             return True
             
         except Exception as e:
-            logger.error(f"Error updating transaction: {e}")
+            logger.error(f"Error updating transactions: {e}")
             return False
     
     # User methods
     def create_user(self, email: str, hashed_password: str) -> Dict:
         """Create a new user"""
         try:
-            all_records = self.users_worksheet.get_all_values()
-            next_id = len(all_records)
+            next_id = self._user_ids.next_id()
             now = datetime.utcnow().isoformat()
             
             row = [next_id, email, hashed_password, now]
@@ -236,5 +695,5 @@ class GoogleSheetsDB:
             logger.error(f"Error getting user by ID: {e}")
             return None
 
-# Singleton instance
-sheets_db = GoogleSheetsDB()
+# Singleton instance, connected on first use
+get_sheets_db = LazySingleton(GoogleSheetsDB)
@@ -0,0 +1,100 @@
+import logging
+import threading
+from contextlib import nullcontext
+import time
+from ..config import settings
+from ..utils.lazy import LazySingleton
+from ..utils.process_lock import locked, runtime_path
+from .base import TransactionStore
+from .sqlite import SQLiteTransactionStore
+from .mirror import MirroredTransactionStore
+from .sheets_journal import SheetsJournal
+from .tx_finality import TxFinalityStore
+from .quote_store import QuoteStore
+
+logger = logging.getLogger(__name__)
+
+# Present while an existing sheet still has to be imported into the local store
+SHEETS_IMPORT_PENDING = "sheets_import.pending"
+SHEETS_IMPORT_LOCK = "sheets_import.lock"
+
+
+def uses_sheets() -> bool:
+    """Whether the configured store talks to Google Sheets at all"""
+    if settings.storage_backend == "sheets":
+        return True
+    return bool(
+        settings.sheets_mirror_enabled
+        and settings.google_sheets_credentials_file
+        and settings.google_sheets_spreadsheet_id
+    )
+
+
+def create_transaction_store() -> TransactionStore:
+    """Build the store selected by settings.storage_backend"""
+    if settings.storage_backend == "sheets":
+        from ..sheets_db import GoogleSheetsDB, get_sheets_db
+        TransactionStore.register(GoogleSheetsDB)
+        logger.info("Using Google Sheets as transaction store")
+        return get_sheets_db()
+
+    store = SQLiteTransactionStore()
+    logger.info(f"Using local transaction store: {settings.database_url}")
+
+    if not uses_sheets():
+        return store
+
+    from ..sheets_db import get_sheets_db
+
+    journal = SheetsJournal(get_sheets_db)
+    pending = runtime_path(SHEETS_IMPORT_PENDING)
+    # First start on an existing deployment: take over what is already in the sheet
+    if store.count() == 0:
+        pending.touch()
+    if pending.exists():
+        # Sheets may be slow or down: never hold up the store for it
+        threading.Thread(target=_import_from_sheets, args=(store, journal), name="sheets-import", daemon=True).start()
+    else:
+        journal.start()
+    logger.info("Mirroring transactions to Google Sheets through the write-behind journal")
+    return MirroredTransactionStore(store, journal, create_guard=_sheets_import_guard)
+
+
+def _sheets_import_guard():
+    """While the sheet import is pending, keep creates from interleaving with its ID moves"""
+    if runtime_path(SHEETS_IMPORT_PENDING).exists():
+        return locked(SHEETS_IMPORT_LOCK)
+    return nullcontext()
+
+
+def _import_from_sheets(store: SQLiteTransactionStore, journal: SheetsJournal):
+    """Import the existing sheet once, retrying until Sheets answers, then start mirroring.
+
+    The journal is not flushed before the import, so orders placed in the
+    meantime can still be moved to new IDs without reaching the sheet twice.
+    Only the local part runs under the lock, so creates never wait on Sheets.
+    """
+    from ..sheets_db import get_sheets_db
+
+    pending = runtime_path(SHEETS_IMPORT_PENDING)
+    while pending.exists():
+        try:
+            existing = get_sheets_db().get_all_transactions()
+            with locked(SHEETS_IMPORT_LOCK):
+                if pending.exists():
+                    journal.renumber(store.import_transactions(existing))
+                    pending.unlink()
+        except Exception as e:
+            logger.error(f"Could not import transactions from Google Sheets, retrying: {e}")
+            time.sleep(settings.warm_up_retry_seconds)
+    journal.start()
+
+
+# Singleton instance, created on first use (also usable as a FastAPI dependency)
+get_transaction_store = LazySingleton(create_transaction_store)
+
+# Confirmation bookkeeping for TRC-20 deposits, created on first use
+get_tx_finality_store = LazySingleton(TxFinalityStore)
+
+# Locked quotes shared by all workers, created on first use
+get_quote_store = LazySingleton(lambda: QuoteStore(settings.quote_store_max_size, settings.quote_ttl_seconds))
@@ -0,0 +1,65 @@
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Dict, List, Optional
+
+
+class TransactionStore(ABC):
+    """Storage interface used by the API routes and the Telegram bot.
+
+    Transactions are plain dicts with the same keys as the Transactions
+    worksheet ('id', 'hash', 'status', 'created_at', ...).
+    """
+
+    @abstractmethod
+    def create_transaction(self, transaction_data: Dict) -> Dict:
+        """Create a new transaction and return it with 'id' and timestamps set"""
+
+    @abstractmethod
+    def get_transaction_by_hash(self, hash: str) -> Optional[Dict]:
+        """Get transaction by hash"""
+
+    @abstractmethod
+    def get_transaction_by_id(self, transaction_id: int) -> Optional[Dict]:
+        """Get transaction by ID"""
+
+    @abstractmethod
+    def get_transaction_by_deposit_address(self, address: str) -> Optional[Dict]:
+        """Get the transaction a deposit address was generated for"""
+
+    @abstractmethod
+    def get_transactions_by_user(self, user_id: int) -> List[Dict]:
+        """Get all transactions for a user"""
+
+    @abstractmethod
+    def get_transactions_by_status(self, status: str) -> List[Dict]:
+        """Get all transactions with the given status"""
+
+    @abstractmethod
+    def get_all_transactions(self) -> List[Dict]:
+        """Get all transactions, oldest first"""
+
+    @abstractmethod
+    def list_transactions(
+        self,
+        status: Optional[str] = None,
+        type: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        cursor: Optional[int] = None,
+        offset: int = 0,
+        limit: int = 50
+    ) -> List[Dict]:
+        """List transactions newest first.
+
+        ``since``/``until`` bound created_at (naive UTC), ``cursor`` returns only
+        transactions older than that ID (keyset pagination) and ``offset``
+        skips that many matches after the cursor.
+        """
+
+    @abstractmethod
+    def update_transactions(self, updates_by_id: Dict[int, Dict]) -> bool:
+        """Apply field updates to many transactions at once"""
+
+    def update_transaction(self, transaction_id: int, updates: Dict) -> bool:
+        """Update a transaction"""
+        return self.update_transactions({transaction_id: updates})
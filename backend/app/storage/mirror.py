@@ -0,0 +1,73 @@
+from contextlib import nullcontext
+from datetime import datetime
+import logging
+from typing import Dict, List, Optional
+from .base import TransactionStore
+
+logger = logging.getLogger(__name__)
+
+
+class MirroredTransactionStore(TransactionStore):
+    """Serves everything from ``primary`` and copies writes to ``mirror``.
+
+    Mirror failures are logged and never fail the request: the primary store
+    is the source of truth, the mirror (Google Sheets) is for humans.
+    ``create_guard`` (a context manager factory) is held around each create.
+    """
+
+    def __init__(self, primary: TransactionStore, mirror, create_guard=None):
+        self.primary = primary
+        self.mirror = mirror
+        self.create_guard = create_guard or nullcontext
+
+    def create_transaction(self, transaction_data: Dict) -> Dict:
+        with self.create_guard():
+            result = self.primary.create_transaction(transaction_data)
+            try:
+                self.mirror.create_transaction(dict(result))
+            except Exception as e:
+                logger.error(f"Failed to mirror transaction {result['id']}: {e}")
+        return result
+
+    def update_transactions(self, updates_by_id: Dict[int, Dict]) -> bool:
+        updated = self.primary.update_transactions(updates_by_id)
+        if updated:
+            try:
+                if not self.mirror.update_transactions(updates_by_id):
+                    logger.error(f"Failed to mirror updates for transactions {list(updates_by_id)}")
+            except Exception as e:
+                logger.error(f"Failed to mirror updates for transactions {list(updates_by_id)}: {e}")
+        return updated
+
+    def get_transaction_by_hash(self, hash: str) -> Optional[Dict]:
+        return self.primary.get_transaction_by_hash(hash)
+
+    def get_transaction_by_id(self, transaction_id: int) -> Optional[Dict]:
+        return self.primary.get_transaction_by_id(transaction_id)
+
+    def get_transaction_by_deposit_address(self, address: str) -> Optional[Dict]:
+        return self.primary.get_transaction_by_deposit_address(address)
+
+    def get_transactions_by_user(self, user_id: int) -> List[Dict]:
+        return self.primary.get_transactions_by_user(user_id)
+
+    def get_transactions_by_status(self, status: str) -> List[Dict]:
+        return self.primary.get_transactions_by_status(status)
+
+    def get_all_transactions(self) -> List[Dict]:
+        return self.primary.get_all_transactions()
+
+    def list_transactions(
+        self,
+        status: Optional[str] = None,
+        type: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        cursor: Optional[int] = None,
+        offset: int = 0,
+        limit: int = 50
+    ) -> List[Dict]:
+        return self.primary.list_transactions(
+            status=status, type=type, since=since, until=until,
+            cursor=cursor, offset=offset, limit=limit
+        )
@@ -0,0 +1,70 @@
+"""Locked price quotes, shared by all workers through the local database"""
+import json
+import logging
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+from ..database import Base, SessionLocal, engine
+from ..models import LockedQuote
+
+logger = logging.getLogger(__name__)
+
+
+class QuoteStore:
+    """Bounded store of quotes that expire after a fixed TTL.
+
+    Quotes live in SQLite, so a quote issued by one worker can be used by an
+    order placed on another. Expired quotes are purged whenever new ones are
+    stored; when the store is full the quotes closest to expiry are evicted.
+    take() deletes the row in the same statement that claims it, so a quote
+    backs at most one order across all processes.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        Base.metadata.create_all(bind=engine)
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+
+    def create_many(self, quotes: List[Dict]) -> List[Dict]:
+        """Store each quote under a new id and stamp it with its expiry"""
+        now = time.time()
+        expires = now + self.ttl_seconds
+        expires_at = datetime.fromtimestamp(expires, timezone.utc).isoformat()
+        quotes = [dict(quote, quote_id=uuid.uuid4().hex, expires_at=expires_at) for quote in quotes]
+        with SessionLocal() as db:
+            db.query(LockedQuote).filter(LockedQuote.expires_at <= now).delete(synchronize_session=False)
+            db.add_all(LockedQuote(quote_id=quote['quote_id'], payload=json.dumps(quote), expires_at=expires) for quote in quotes)
+            db.flush()
+            excess = db.query(LockedQuote).count() - self.max_size
+            if excess > 0:
+                oldest = db.query(LockedQuote.quote_id).order_by(LockedQuote.expires_at).limit(excess)
+                db.query(LockedQuote).filter(LockedQuote.quote_id.in_(oldest.scalar_subquery())).delete(synchronize_session=False)
+            db.commit()
+        return quotes
+
+    def create(self, quote: Dict) -> Dict:
+        return self.create_many([quote])[0]
+
+    def get(self, quote_id: str) -> Optional[Dict]:
+        with SessionLocal() as db:
+            row = db.get(LockedQuote, quote_id)
+            if row is None or row.expires_at <= time.time():
+                return None
+            return json.loads(row.payload)
+
+    def take(self, quote_id: str) -> Optional[Dict]:
+        """Remove and return a live quote, so it can back only one order"""
+        with SessionLocal() as db:
+            row = db.get(LockedQuote, quote_id)
+            if row is None or row.expires_at <= time.time():
+                return None
+            payload = row.payload
+            # Only the process whose delete hits the row gets the quote
+            claimed = db.query(LockedQuote).filter(LockedQuote.quote_id == quote_id).delete(synchronize_session=False)
+            db.commit()
+        return json.loads(payload) if claimed else None
+
+    def __len__(self):
+        with SessionLocal() as db:
+            return db.query(LockedQuote).filter(LockedQuote.expires_at > time.time()).count()
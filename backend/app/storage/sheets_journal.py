@@ -0,0 +1,181 @@
+from collections import OrderedDict
+from datetime import datetime
+import json
+import logging
+import threading
+import time
+from typing import Dict
+from ..config import settings
+from ..database import Base, SessionLocal, engine
+from ..models import SheetsJournalEntry
+from ..utils.process_lock import try_acquire
+
+logger = logging.getLogger(__name__)
+
+FLUSHER_LOCK = "sheets_flusher.lock"
+
+
+class SheetsJournal:
+    """Write-behind mirror for Google Sheets.
+
+    Writes are appended to a local journal table and acknowledged at once; a
+    background flusher coalesces pending entries into one ``append_rows`` and
+    one ``batch_update`` per round, retrying with exponential backoff. Entries
+    are only deleted after Google accepted them, so whatever is left in the
+    journal after a crash is replayed when the flusher starts again. Only one
+    process (API or bot) flushes at a time.
+    """
+
+    def __init__(self, get_sheets):
+        self._get_sheets = get_sheets
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._owner = None
+        self._failures = 0
+        Base.metadata.create_all(bind=engine)
+
+    def _append(self, entries):
+        with SessionLocal() as db:
+            db.add_all(entries)
+            db.commit()
+        self._wakeup.set()
+
+    def create_transaction(self, transaction_data: Dict) -> Dict:
+        self._append([SheetsJournalEntry(
+            op='create',
+            transaction_id=int(transaction_data['id']),
+            payload=json.dumps(transaction_data, default=str)
+        )])
+        return transaction_data
+
+    def update_transactions(self, updates_by_id: Dict[int, Dict]) -> bool:
+        now = datetime.utcnow().isoformat()
+        self._append([
+            SheetsJournalEntry(
+                op='update',
+                transaction_id=int(transaction_id),
+                payload=json.dumps(dict(updates, updated_at=now), default=str)
+            )
+            for transaction_id, updates in updates_by_id.items()
+        ])
+        return True
+
+    def renumber(self, moved: Dict[int, int]):
+        """Point pending entries at transactions that got new IDs (old -> new)"""
+        if not moved:
+            return
+        with SessionLocal() as db:
+            entries = db.query(SheetsJournalEntry).filter(SheetsJournalEntry.transaction_id.in_(list(moved))).all()
+            for entry in entries:
+                entry.transaction_id = moved[entry.transaction_id]
+                if entry.op == 'create':
+                    entry.payload = json.dumps(dict(json.loads(entry.payload), id=entry.transaction_id), default=str)
+            db.commit()
+
+    def pending_count(self) -> int:
+        with SessionLocal() as db:
+            return db.query(SheetsJournalEntry).count()
+
+    def flush(self) -> int:
+        """Send one batch of pending entries to Google Sheets; returns entries flushed"""
+        with SessionLocal() as db:
+            entries = (
+                db.query(SheetsJournalEntry)
+                .order_by(SheetsJournalEntry.id)
+                .limit(settings.sheets_flush_batch_size)
+                .all()
+            )
+            if not entries:
+                return 0
+
+            creates = OrderedDict()
+            updates = OrderedDict()
+            create_entry_ids = {}  # transaction id -> journal entry ids folded into its row
+            update_entry_ids = []
+            for entry in entries:
+                payload = json.loads(entry.payload)
+                if entry.op == 'create':
+                    creates[entry.transaction_id] = payload
+                    create_entry_ids.setdefault(entry.transaction_id, []).append(entry.id)
+                elif entry.transaction_id in creates:
+                    # Row not written yet: fold the update into it
+                    creates[entry.transaction_id].update(payload)
+                    create_entry_ids[entry.transaction_id].append(entry.id)
+                else:
+                    updates.setdefault(entry.transaction_id, {}).update(payload)
+                    update_entry_ids.append(entry.id)
+
+            try:
+                sheets = self._get_sheets()
+                # A crash between append and delete replays rows the sheet already has: update those instead
+                for transaction_id in [tid for tid in creates if sheets.transactions.get('id', tid) is not None]:
+                    payload = creates.pop(transaction_id)
+                    payload.pop('id', None)
+                    updates.setdefault(transaction_id, {}).update(payload)
+                    update_entry_ids.extend(create_entry_ids.pop(transaction_id))
+                create_entry_ids = [entry_id for ids in create_entry_ids.values() for entry_id in ids]
+                if creates:
+                    sheets.append_transactions(list(creates.values()))
+                    self._delete(db, create_entry_ids)
+                if updates:
+                    if not sheets.update_transactions(dict(updates)):
+                        raise RuntimeError("batch_update failed")
+                    self._delete(db, update_entry_ids)
+            except Exception as e:
+                db.rollback()
+                db.query(SheetsJournalEntry).filter(
+                    SheetsJournalEntry.id.in_([entry.id for entry in entries])
+                ).update({
+                    SheetsJournalEntry.attempts: SheetsJournalEntry.attempts + 1,
+                    SheetsJournalEntry.last_error: str(e)
+                }, synchronize_session=False)
+                db.commit()
+                raise
+
+            logger.info(f"Flushed {len(entries)} journal entries to Google Sheets "
+                        f"({len(creates)} new rows, {len(updates)} updated)")
+            return len(entries)
+
+    @staticmethod
+    def _delete(db, entry_ids):
+        db.query(SheetsJournalEntry).filter(SheetsJournalEntry.id.in_(entry_ids)).delete(synchronize_session=False)
+        db.commit()
+
+    def start(self):
+        """Start the background flusher (replays anything left from a previous run)"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="sheets-flusher", daemon=True)
+        self._thread.start()
+
+    def _next_delay(self) -> float:
+        if not self._failures:
+            return settings.sheets_flush_interval_seconds
+        backoff = settings.sheets_flush_interval_seconds * (2 ** self._failures)
+        return min(backoff, settings.sheets_flush_max_backoff_seconds)
+
+    def _run(self):
+        while True:
+            if self._owner is None:
+                self._owner = try_acquire(FLUSHER_LOCK)
+                if self._owner is None:
+                    # Another process is flushing; check again later in case it exits
+                    self._wakeup.wait(settings.sheets_flush_max_backoff_seconds)
+                    self._wakeup.clear()
+                    continue
+                logger.info(f"Sheets flusher started, {self.pending_count()} journal entries pending")
+
+            try:
+                while self.flush() >= settings.sheets_flush_batch_size:
+                    pass
+                self._failures = 0
+            except Exception as e:
+                self._failures += 1
+                logger.error(f"Error flushing Sheets journal (attempt {self._failures}): {e}")
+
+            if self._failures:
+                # Backing off: new writes must not wake us early
+                time.sleep(self._next_delay())
+            else:
+                self._wakeup.wait(self._next_delay())
+            self._wakeup.clear()
@@ -0,0 +1,186 @@
+from datetime import datetime
+import logging
+from typing import Dict, List, Optional
+from sqlalchemy import func
+from ..database import Base, SessionLocal, engine
+from ..models import Transaction
+from .base import TransactionStore
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = [column.name for column in Transaction.__table__.columns]
+NUMERIC_COLUMNS = {'id': int, 'user_id': int, 'amount_usdt': float, 'amount_rub': float}
+DATETIME_COLUMNS = {'created_at', 'updated_at'}
+
+
+def _to_dict(transaction: Transaction) -> Dict:
+    record = {}
+    for column in COLUMNS:
+        value = getattr(transaction, column)
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        record[column] = value
+    return record
+
+
+def _from_record(record: Dict) -> Dict:
+    """Coerce a worksheet record ('' for blanks, 'None', ISO strings) into column values"""
+    values = {}
+    for column in COLUMNS:
+        value = record.get(column)
+        if value in ('', 'None'):
+            value = None
+        if value is not None and column in NUMERIC_COLUMNS:
+            try:
+                value = NUMERIC_COLUMNS[column](value)
+            except (TypeError, ValueError):
+                value = None
+        elif value is not None and column in DATETIME_COLUMNS:
+            try:
+                value = datetime.fromisoformat(str(value))
+            except ValueError:
+                value = None
+        elif value is not None:
+            value = str(value)
+        values[column] = value
+    return values
+
+
+class SQLiteTransactionStore(TransactionStore):
+    """Transaction store backed by the local SQLAlchemy database (SQLite/WAL)"""
+
+    def __init__(self):
+        Base.metadata.create_all(bind=engine)
+
+    def create_transaction(self, transaction_data: Dict) -> Dict:
+        now = datetime.utcnow()
+        values = {key: value for key, value in transaction_data.items() if key in COLUMNS and key != 'id'}
+        values.setdefault('status', 'pending')
+        values['created_at'] = now
+        values['updated_at'] = now
+
+        with SessionLocal() as db:
+            transaction = Transaction(**values)
+            db.add(transaction)
+            db.commit()
+            db.refresh(transaction)
+            result = _to_dict(transaction)
+
+        logger.info(f"Created transaction with ID: {result['id']}")
+        return result
+
+    def import_transactions(self, records: List[Dict]) -> Dict[int, int]:
+        """Bulk-load existing records (e.g. from the Google Sheet), keeping their IDs.
+
+        Records whose hash is already stored are skipped. Local transactions
+        created before the import that hold one of the imported IDs are moved
+        to new IDs after the highest one; returns those moves (old -> new).
+        """
+        rows = [_from_record(record) for record in records]
+        rows = [row for row in rows if row['id'] is not None and row['hash']]
+        moved = {}
+        with SessionLocal() as db:
+            local = dict(db.query(Transaction.id, Transaction.hash))
+            known_hashes = set(local.values())
+            rows = [row for row in rows if row['hash'] not in known_hashes]
+            next_id = max([*local, *(row['id'] for row in rows), 0]) + 1
+            for row in rows:
+                if row['id'] in local:
+                    moved[row['id']] = next_id
+                    next_id += 1
+            for old_id, new_id in moved.items():
+                db.query(Transaction).filter(Transaction.id == old_id).update({Transaction.id: new_id}, synchronize_session=False)
+            for row in rows:
+                db.merge(Transaction(**row))
+            db.commit()
+        logger.info(f"Imported {len(rows)} transactions into local store")
+        if moved:
+            logger.warning(f"Moved local transactions out of the way of imported IDs: {moved}")
+        return moved
+
+    def _get_one(self, *criteria) -> Optional[Dict]:
+        with SessionLocal() as db:
+            transaction = db.query(Transaction).filter(*criteria).order_by(Transaction.id).first()
+            return _to_dict(transaction) if transaction else None
+
+    def _get_many(self, *criteria) -> List[Dict]:
+        with SessionLocal() as db:
+            return [_to_dict(t) for t in db.query(Transaction).filter(*criteria).order_by(Transaction.id)]
+
+    def get_transaction_by_hash(self, hash: str) -> Optional[Dict]:
+        return self._get_one(Transaction.hash == hash)
+
+    def get_transaction_by_id(self, transaction_id: int) -> Optional[Dict]:
+        return self._get_one(Transaction.id == int(transaction_id))
+
+    def get_transaction_by_deposit_address(self, address: str) -> Optional[Dict]:
+        return self._get_one(Transaction.deposit_address == address)
+
+    def get_transactions_by_user(self, user_id: int) -> List[Dict]:
+        return self._get_many(Transaction.user_id == int(user_id))
+
+    def get_transactions_by_status(self, status: str) -> List[Dict]:
+        return self._get_many(Transaction.status == status)
+
+    def get_all_transactions(self) -> List[Dict]:
+        return self._get_many()
+
+    def list_transactions(
+        self,
+        status: Optional[str] = None,
+        type: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        cursor: Optional[int] = None,
+        offset: int = 0,
+        limit: int = 50
+    ) -> List[Dict]:
+        criteria = []
+        if status:
+            criteria.append(Transaction.status == status)
+        if type:
+            criteria.append(Transaction.type == type)
+        if since:
+            criteria.append(Transaction.created_at >= since)
+        if until:
+            criteria.append(Transaction.created_at < until)
+        if cursor:
+            criteria.append(Transaction.id < int(cursor))
+
+        with SessionLocal() as db:
+            query = (
+                db.query(Transaction)
+                .filter(*criteria)
+                .order_by(Transaction.id.desc())
+                .offset(offset)
+                .limit(limit)
+            )
+            return [_to_dict(t) for t in query]
+
+    def count(self) -> int:
+        with SessionLocal() as db:
+            return db.query(func.count(Transaction.id)).scalar()
+
+    def update_transactions(self, updates_by_id: Dict[int, Dict]) -> bool:
+        if not updates_by_id:
+            return True
+        try:
+            now = datetime.utcnow()
+            with SessionLocal() as db:
+                ids = [int(transaction_id) for transaction_id in updates_by_id]
+                transactions = {t.id: t for t in db.query(Transaction).filter(Transaction.id.in_(ids))}
+                for transaction_id, updates in updates_by_id.items():
+                    transaction = transactions.get(int(transaction_id))
+                    if transaction is None:
+                        logger.warning(f"Transaction {transaction_id} not found for update")
+                        continue
+                    for key, value in updates.items():
+                        if key in COLUMNS and key != 'id':
+                            setattr(transaction, key, value)
+                    transaction.updated_at = now
+                db.commit()
+            logger.info(f"Updated transactions {list(updates_by_id)}")
+            return True
+        except Exception as e:
+            logger.error(f"Error updating transactions: {e}")
+            return False
@@ -0,0 +1,52 @@
+import logging
+import threading
+from typing import Optional, Tuple
+from ..database import Base, SessionLocal, engine
+from ..models import TronTxFinality
+
+logger = logging.getLogger(__name__)
+
+MAX_CACHED_TXIDS = 10000
+
+
+class TxFinalityStore:
+    """Persistent txid -> (block number, finalized) map for TRC-20 deposits.
+
+    Block numbers do not change once a transaction is in a block, so records
+    are also kept in a bounded in-memory map: after the first lookup a txid
+    is answered without touching the database or the network.
+    """
+
+    def __init__(self):
+        Base.metadata.create_all(bind=engine)
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def _remember(self, txid: str, record: Tuple[int, bool]):
+        with self._lock:
+            if txid not in self._cache and len(self._cache) >= MAX_CACHED_TXIDS:
+                self._cache.pop(next(iter(self._cache)))
+            self._cache[txid] = record
+
+    def get(self, txid: str) -> Optional[Tuple[int, bool]]:
+        """(block_number, finalized) for a txid seen before, else None"""
+        record = self._cache.get(txid)
+        if record is not None:
+            return record
+        with SessionLocal() as db:
+            row = db.get(TronTxFinality, txid)
+            if row is None:
+                return None
+            record = (row.block_number, bool(row.finalized))
+        self._remember(txid, record)
+        return record
+
+    def save(self, txid: str, block_number: int, finalized: bool = False):
+        if self._cache.get(txid) == (block_number, finalized):
+            return
+        with SessionLocal() as db:
+            db.merge(TronTxFinality(txid=txid, block_number=block_number, finalized=finalized))
+            db.commit()
+        self._remember(txid, (block_number, finalized))
+        if finalized:
+            logger.info(f"Transaction {txid[:16]}... is final at block {block_number}")
@@ -3,8 +3,8 @@ from telegram import Update
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
 from decimal import Decimal
 from .config import settings
-from .sheets_db import sheets_db
-from .utils.tron_wallet import tron_wallet
+from .storage import get_transaction_store
+from .utils.tron_wallet import get_tron_wallet
 
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -116,13 +116,7 @@ class CoinConvertBot:
         
         try:
             # Get transaction from database
-            all_transactions = sheets_db.get_all_transactions()
-            transaction = None
-            
-            for tx in all_transactions:
-                if tx.get('id') == transaction_id or str(tx.get('id')) == str(transaction_id):
-                    transaction = tx
-                    break
+            transaction = get_transaction_store().get_transaction_by_id(transaction_id)
             
             if not transaction:
                 await checking_msg.edit_text(f"❌ Транзакция #{transaction_id} не найдена")
@@ -160,7 +154,7 @@ class CoinConvertBot:
                     current_status = transaction.get('status', 'pending')
                     check_confirmations = (current_status == 'confirming')
                     
-                    result = tron_wallet.check_incoming_transaction(
+                    result = get_tron_wallet().check_incoming_transaction(
                         deposit_address,
                         Decimal(str(amount_usdt)),
                         check_confirmations=check_confirmations
@@ -172,23 +166,23 @@ class CoinConvertBot:
                     if result.get('received'):
                         if check_confirmations:
                             confirmations = result.get('min_confirmations', 0)
-                            message += f"✅ <b>Подтверждения:</b> {confirmations}/20\n"
+                            message += f"✅ <b>Подтверждения:</b> {confirmations}/{settings.tron_min_confirmations}\n"
                             
                             if result.get('confirmed'):
                                 # Update to completed
-                                sheets_db.update_transaction(transaction_id, {'status': 'completed'})
+                                get_transaction_store().update_transaction(transaction_id, {'status': 'completed'})
                                 message += "\n🎉 <b>Транзакция завершена!</b>"
                                 logger.info(f"Transaction #{transaction_id} marked as completed by bot command")
                             else:
                                 # Update to confirming if was pending
                                 if current_status == 'pending':
-                                    sheets_db.update_transaction(transaction_id, {'status': 'confirming'})
+                                    get_transaction_store().update_transaction(transaction_id, {'status': 'confirming'})
                                     message += "\n⏳ Ожидание подтверждений..."
                                 else:
-                                    message += f"\n⏳ Недостаточно подтверждений (нужно 20)"
+                                    message += f"\n⏳ Недостаточно подтверждений (нужно {settings.tron_min_confirmations})"
                         else:
                             # Just received, move to confirming
-                            sheets_db.update_transaction(transaction_id, {'status': 'confirming'})
+                            get_transaction_store().update_transaction(transaction_id, {'status': 'confirming'})
                             message += "\n✅ Платеж получен! Ожидание подтверждений..."
                             logger.info(f"Transaction #{transaction_id} moved to confirming by bot command")
                     else:
@@ -210,15 +204,19 @@ class CoinConvertBot:
             return
         
         try:
-            transactions = sheets_db.get_all_transactions()
+            # Get last 5 transactions, newest first
+            recent_transactions = get_transaction_store().list_transactions(limit=5)
             
-            if not transactions:
+            if not recent_transactions:
                 await update.message.reply_text("📭 Транзакций нет")
                 return
             
-            # Get last 5 transactions
-            recent_transactions = transactions[-5:] if len(transactions) > 5 else transactions
-            recent_transactions.reverse()  # Show newest first
+            # Deposit balances of open sell orders, fetched together
+            open_deposits = [
+                tx.get('deposit_address') for tx in recent_transactions
+                if tx.get('type') == 'sell' and tx.get('status') in ('pending', 'confirming')
+            ]
+            balances = get_tron_wallet().get_usdt_balances(open_deposits) if open_deposits else {'balances': {}, 'errors': {}}
             
             message = "<b>📋 Последние транзакции:</b>\n\n"
             
@@ -237,7 +235,13 @@ class CoinConvertBot:
                 status_icon = status_icons.get(status, '📋')
                 
                 message += f"<b>#{tx_id}</b> | {tx_type} | {status_icon} {status}\n"
-                message += f"   💵 {amount_usdt} USDT\n\n"
+                message += f"   💵 {amount_usdt} USDT\n"
+                deposit_address = tx.get('deposit_address')
+                if deposit_address in balances['balances']:
+                    message += f"   💰 Баланс: {balances['balances'][deposit_address]} USDT\n"
+                elif deposit_address in balances['errors']:
+                    message += f"   💰 Баланс: не удалось получить\n"
+                message += "\n"
             
             message += "\nИспользуйте /check [ID] для проверки"
             
@@ -272,13 +276,7 @@ class CoinConvertBot:
         
         try:
             # Get transaction from database
-            all_transactions = sheets_db.get_all_transactions()
-            transaction = None
-            
-            for tx in all_transactions:
-                if tx.get('id') == transaction_id or str(tx.get('id')) == str(transaction_id):
-                    transaction = tx
-                    break
+            transaction = get_transaction_store().get_transaction_by_id(transaction_id)
             
             if not transaction:
                 await update.message.reply_text(f"❌ Транзакция #{transaction_id} не найдена")
@@ -299,7 +297,7 @@ class CoinConvertBot:
                 return
             
             # Update to completed
-            sheets_db.update_transaction(transaction_id, {'status': 'completed'})
+            get_transaction_store().update_transaction(transaction_id, {'status': 'completed'})
             logger.info(f"Transaction #{transaction_id} marked as paid/completed by admin via bot")
             
             # Build confirmation message
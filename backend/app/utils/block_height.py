@@ -0,0 +1,54 @@
+"""Latest Tron block number, shared by everything that counts confirmations"""
+import logging
+import threading
+import time
+from typing import Optional
+from ..config import settings
+from .trongrid import get_trongrid
+
+logger = logging.getLogger(__name__)
+
+
+class BlockHeightTracker:
+    """Cached chain head.
+
+    current_height() never does I/O. height() returns the cached value while
+    it is younger than settings.tron_block_height_ttl_seconds (about one Tron
+    block) and otherwise fetches /wallet/getnowblock once for all concurrent
+    callers. Anything that sees newer blocks can feed them in with observe().
+    """
+
+    def __init__(self):
+        self._height = None
+        self._updated = None  # time.monotonic() of the last observation
+        self._lock = threading.Lock()
+
+    def current_height(self) -> Optional[int]:
+        """Last known head block number, without any network call (None until first seen)"""
+        return self._height
+
+    def age_seconds(self) -> Optional[float]:
+        return None if self._updated is None else time.monotonic() - self._updated
+
+    def observe(self, height: int):
+        """Record a head block number seen elsewhere; the height never moves backwards"""
+        if self._height is None or height >= self._height:
+            self._height = height
+            self._updated = time.monotonic()
+
+    def _is_fresh(self) -> bool:
+        age = self.age_seconds()
+        return age is not None and age < settings.tron_block_height_ttl_seconds
+
+    def height(self) -> int:
+        """Head block number, at most one TTL old; raises on network errors"""
+        if self._is_fresh():
+            return self._height
+        with self._lock:
+            if not self._is_fresh():
+                block = get_trongrid().post("/wallet/getnowblock")
+                self.observe(block.get('block_header', {}).get('raw_data', {}).get('number', 0))
+        return self._height
+
+
+block_height = BlockHeightTracker()
@@ -0,0 +1,292 @@
+"""Event-driven deposit detection from the USDT Transfer event stream"""
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, List, Optional
+from tronpy.keys import to_hex_address
+from ..config import settings
+from ..storage import get_transaction_store, get_tx_finality_store
+from .block_height import block_height
+from .process_lock import runtime_path, try_acquire
+from .trongrid import get_trongrid
+from .tron_wallet import get_tron_wallet
+
+logger = logging.getLogger(__name__)
+
+WATCHER_LOCK = "deposit_watcher.lock"
+OPEN_STATUSES = ('pending', 'confirming')
+BLOCK_SECONDS = 3  # Tron block interval
+
+
+def _address_key(address: str) -> str:
+    """20-byte hex body of a Tron address, given in base58 or as 0x/41-prefixed hex"""
+    if address.startswith('0x'):
+        return address[2:].lower()[-40:]
+    return to_hex_address(address)[2:].lower()
+
+
+def _created_at(tx: Dict) -> Optional[datetime]:
+    """Creation time of a stored transaction (naive UTC), if it can be parsed"""
+    try:
+        return datetime.fromisoformat(str(tx.get('created_at'))).replace(tzinfo=None)
+    except ValueError:
+        return None
+
+
+class DepositWatcher:
+    """Background thread that follows USDT Transfer events block by block.
+
+    Recipients are matched against an in-memory hash set of the deposit
+    addresses of open sell orders, so the cost grows with chain traffic and
+    not with the number of orders. The set is re-read from the store every
+    settings.deposit_watcher_reload_seconds; orders created in this process
+    are added at once through watch(). Every matching transfer is recorded in
+    the finality store with its txid and block; an order paid in full moves to
+    'confirming' once the on-chain balance agrees (checked again every step
+    until it does) and then to 'completed' after tron_min_confirmations
+    blocks. Each transfer is counted once per (txid, event index), so blocks
+    read again after an error or a rewind change nothing. Orders that opened
+    in another process are found at the next reload, which rewinds the scan
+    to the block they were created in.
+
+    With several workers only one of them (holding WATCHER_LOCK) follows the
+    chain, and nothing is fetched while no deposit is open. The next block to
+    scan is kept in settings.deposit_watcher_cursor_file, so a restart picks
+    up where the previous process stopped (up to deposit_watcher_max_lag_blocks
+    back; older deposits are still found by /check).
+    """
+    INDEX_LAG_BLOCKS = 1  # TronGrid indexes events shortly after the block is produced
+    MAX_BLOCKS_PER_STEP = 20
+    PAGE_SIZE = 200
+
+    def __init__(self):
+        self._thread = None
+        self._lock = threading.Lock()
+        self._owner = None
+        self._deposits = {}  # address key -> open sell transaction
+        self._received = defaultdict(Decimal)  # address key -> USDT seen in transfers since start
+        self._seen = defaultdict(set)  # address key -> (txid, event index) already counted
+        self._unpriced = set()  # Orders without a USDT amount, logged once
+        self._unverified = {}  # address key -> (txid, block number) of orders paid by count, not yet by balance
+        self._short = set()  # Address keys whose balance was found short, logged once
+        self._awaiting = {}  # txid -> (transaction id, block number) of paid orders
+        self._reloaded = None  # time.monotonic() of the last reload
+        self._rewind_since = None  # Earliest creation time of orders found by the last reload
+        self._next_block = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self._owner is not None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="deposit-watcher", daemon=True)
+                self._thread.start()
+
+    def watch(self, transaction: Dict):
+        """Start matching a newly created sell order without waiting for the next reload"""
+        if transaction.get('deposit_address'):
+            self._deposits[_address_key(transaction['deposit_address'])] = transaction
+
+    def _try_lead(self) -> bool:
+        if self._owner is None:
+            self._owner = try_acquire(WATCHER_LOCK)
+            if self._owner is not None:
+                logger.info("This process now follows USDT transfers for deposit detection")
+        return self._owner is not None
+
+    def _reload(self):
+        finality = get_tx_finality_store()
+        deposits = {}
+        for status in OPEN_STATUSES:
+            for tx in get_transaction_store().get_transactions_by_status(status):
+                if tx.get('type') != 'sell' or not tx.get('deposit_address'):
+                    continue
+                deposits[_address_key(tx['deposit_address'])] = tx
+                # Paid before a restart: keep counting its confirmations
+                txid = tx.get('tron_txid')
+                if status == 'confirming' and txid and txid not in self._awaiting:
+                    record = finality.get(txid)
+                    if record is not None:
+                        self._awaiting[txid] = (tx['id'], record[0])
+        if self._reloaded is not None:
+            # Opened elsewhere since the last reload: their first blocks may already be behind us
+            created = [_created_at(tx) for key, tx in deposits.items() if key not in self._deposits]
+            created = [value for value in created if value is not None]
+            if created:
+                self._rewind_since = min([*created, self._rewind_since or datetime.max])
+        self._deposits = deposits
+        # Forget transfers to orders that are no longer open
+        self._received = defaultdict(Decimal, {key: value for key, value in self._received.items() if key in deposits})
+        self._seen = defaultdict(set, {key: value for key, value in self._seen.items() if key in deposits})
+        self._unverified = {key: value for key, value in self._unverified.items() if key in deposits}
+        self._short &= set(self._unverified)
+        self._reloaded = time.monotonic()
+
+    def _load_cursor(self) -> Optional[int]:
+        try:
+            return int(runtime_path(settings.deposit_watcher_cursor_file).read_text())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _save_cursor(self, block_number: int):
+        path = runtime_path(settings.deposit_watcher_cursor_file)
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, 'w') as handle:
+                handle.write(str(block_number))
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.error(f"Error writing deposit watcher cursor: {e}")
+
+    def _transfers(self, block_number: int) -> List[dict]:
+        """All USDT Transfer events of one block, following TronGrid's pagination"""
+        params = {'event_name': 'Transfer', 'block_number': block_number, 'limit': self.PAGE_SIZE}
+        events = []
+        while True:
+            data = get_trongrid().get(
+                f"/v1/contracts/{settings.usdt_trc20_contract}/events",
+                params=params,
+                endpoint="/v1/contracts/{address}/events"
+            )
+            events.extend(data.get('data', []))
+            fingerprint = data.get('meta', {}).get('fingerprint')
+            if not fingerprint:
+                return events
+            params = dict(params, fingerprint=fingerprint)
+
+    def _match(self, event: dict):
+        result = event.get('result', {})
+        key = _address_key(result.get('to') or '0x')
+        tx = self._deposits.get(key)
+        if tx is None:
+            return
+
+        txid = event['transaction_id']
+        block_number = event['block_number']
+        event_id = (txid, event.get('event_index'))
+        if event_id in self._seen[key]:
+            return
+        self._seen[key].add(event_id)
+        amount = Decimal(str(result.get('value', 0))) / Decimal(10**6)
+        self._received[key] += amount
+        logger.info(f"USDT transfer of {amount} to {tx['deposit_address']} (transaction {tx['id']}): {txid[:16]}... in block {block_number}")
+        get_tx_finality_store().save(txid, block_number)
+
+        if tx.get('status') != 'pending':
+            return
+        if not tx.get('amount_usdt'):
+            if tx['id'] not in self._unpriced:
+                self._unpriced.add(tx['id'])
+                logger.warning(f"Transaction {tx['id']} has no USDT amount, leaving it to /check")
+            return
+        if self._received[key] >= Decimal(str(tx['amount_usdt'])):
+            self._unverified[key] = (txid, block_number)
+
+    def _verify_paid(self):
+        """Move orders paid by count to 'confirming' once the on-chain balance agrees.
+
+        Trusts the chain over our own count before an order can be paid out.
+        Addresses whose balance can't be read or is still short stay in
+        _unverified and are checked again next step.
+        """
+        deposits = {key: self._deposits.get(key) for key in self._unverified}
+        for key, tx in deposits.items():
+            if tx is None or tx.get('status') != 'pending':
+                del self._unverified[key]
+                self._short.discard(key)
+        deposits = {key: tx for key, tx in deposits.items() if key in self._unverified}
+        if not deposits:
+            return
+
+        balances = get_tron_wallet().get_usdt_balances([tx['deposit_address'] for tx in deposits.values()])['balances']
+        for key, tx in deposits.items():
+            balance = balances.get(tx['deposit_address'])
+            if balance is None:
+                continue  # Logged by get_usdt_balances
+            if balance < Decimal(str(tx['amount_usdt'])):
+                if key not in self._short:
+                    self._short.add(key)
+                    logger.warning(f"Transfers to {tx['deposit_address']} add up to {self._received[key]} USDT but the balance is {balance}, transaction {tx['id']} stays pending")
+                continue
+            txid, block_number = self._unverified[key]
+            if get_transaction_store().update_transaction(tx['id'], {'status': 'confirming', 'tron_txid': txid}):
+                tx['status'] = 'confirming'
+                del self._unverified[key]
+                self._short.discard(key)
+                self._awaiting[txid] = (tx['id'], block_number)
+                logger.info(f"Transaction {tx['id']} paid, moved to confirming")
+
+    def _complete_confirmed(self):
+        head = block_height.current_height()
+        for txid, (transaction_id, block_number) in list(self._awaiting.items()):
+            if head is None or head - block_number < settings.tron_min_confirmations:
+                continue
+            get_tx_finality_store().save(txid, block_number, finalized=True)
+            if get_transaction_store().update_transaction(transaction_id, {'status': 'completed'}):
+                del self._awaiting[txid]
+                logger.info(f"Transaction {transaction_id} completed with {head - block_number} confirmations")
+
+    def _step(self):
+        if self._reloaded is None or time.monotonic() - self._reloaded >= settings.deposit_watcher_reload_seconds:
+            self._reload()
+        if not self._deposits and not self._awaiting:
+            self._next_block = None  # Nothing to match: stay off the chain until an order opens
+            return
+
+        head = block_height.height() - self.INDEX_LAG_BLOCKS
+        if self._next_block is None:
+            cursor = self._load_cursor()
+            if cursor is not None and head - cursor <= settings.deposit_watcher_max_lag_blocks:
+                self._next_block = cursor
+            else:
+                # Cover orders that opened elsewhere since the last reload
+                self._next_block = head - int(settings.deposit_watcher_reload_seconds / BLOCK_SECONDS)
+        elif head - self._next_block > settings.deposit_watcher_max_lag_blocks:
+            logger.warning(f"Deposit watcher is {head - self._next_block} blocks behind, skipping to the last {settings.deposit_watcher_max_lag_blocks}")
+            self._next_block = head - settings.deposit_watcher_max_lag_blocks
+        if self._rewind_since is not None:
+            blocks_ago = int((datetime.utcnow() - self._rewind_since).total_seconds() / BLOCK_SECONDS) + 1
+            start = head - min(blocks_ago, settings.deposit_watcher_max_lag_blocks)
+            if start < self._next_block:
+                logger.info(f"New deposit addresses since the last reload, rescanning from block {start}")
+                self._next_block = start
+            self._rewind_since = None
+
+        first = self._next_block
+        try:
+            for block_number in range(first, min(head, first + self.MAX_BLOCKS_PER_STEP - 1) + 1):
+                # Apply a block only once all its pages are in
+                for event in self._transfers(block_number):
+                    try:
+                        self._match(event)
+                    except Exception as e:
+                        logger.error(f"Error matching transfer {event.get('transaction_id')}: {e}")
+                self._next_block = block_number + 1
+        finally:
+            if self._next_block > first:
+                self._save_cursor(self._next_block)
+
+        self._verify_paid()
+        self._complete_confirmed()
+
+    def _run(self):
+        while True:
+            if not self._try_lead():
+                time.sleep(settings.deposit_watcher_reload_seconds)
+                continue
+            try:
+                self._step()
+            except Exception as e:
+                logger.error(f"Error following USDT transfers: {e}")
+            time.sleep(settings.deposit_watcher_poll_seconds)
+
+
+deposit_watcher = DepositWatcher()
@@ -1,37 +1,203 @@
+import hashlib
+import json
+import os
 import requests
 import logging
-from datetime import datetime, timedelta
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime
 from decimal import Decimal
+from typing import NamedTuple, Optional
 from ..config import settings
+from .order_book import ASK, BID, DepthBook, DepthLevel, InsufficientLiquidityError
+from .process_lock import runtime_path, try_acquire
+from .rate_history import rate_history
 
 logger = logging.getLogger(__name__)
 
+
+class RateUnavailableError(Exception):
+    """No rate source has produced a usable rate"""
+
+class RatesDisagreeError(RateUnavailableError):
+    """Fresh rates exist but none is close enough to the others to be trusted"""
+
+class _Flight:
+    """A fetch in progress that other callers can wait on"""
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
 class ExchangeRateCache:
-    """Cache for exchange rates to avoid excessive API calls"""
+    """Thread-safe cache for exchange rates to avoid excessive API calls.
+
+    Entries are keyed (one per upstream) and each key can have its own TTL.
+    fetch_once() gives single-flight semantics: while a fetch for a key is in
+    progress, other callers wait for and share its result instead of firing
+    their own request.
+    """
+    def __init__(self, ttls=None, default_ttl=None):
+        self._ttls = dict(ttls or {})
+        self._default_ttl = default_ttl or settings.exchange_rate_cache_minutes * 60
+        self._entries = {}  # key -> (value, monotonic time it was fetched, wall-clock time it was fetched)
+        self._flights = {}
+        self._lock = threading.Lock()
+    
+    def ttl(self, key) -> float:
+        return self._ttls.get(key, self._default_ttl)
+    
+    def set_ttl(self, key, seconds: float):
+        self._ttls[key] = seconds
+    
+    def age_seconds(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return None
+        return time.monotonic() - entry[1]
+    
+    def peek(self, key):
+        """Value for ``key`` even if it has expired (None if never set)"""
+        with self._lock:
+            entry = self._entries.get(key)
+        return entry[0] if entry is not None else None
+    
+    def fetched_at(self, key):
+        """Wall-clock time the value for ``key`` was fetched (None if never set)"""
+        with self._lock:
+            entry = self._entries.get(key)
+        return entry[2] if entry is not None else None
+    
+    def set(self, key, value, fetched_at: float = None):
+        """Store ``value``; ``fetched_at`` (time.time()) back-dates values fetched elsewhere"""
+        now = time.time()
+        fetched_at = now if fetched_at is None else min(fetched_at, now)
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() - (now - fetched_at), fetched_at)
+    
+    def fetch_once(self, key, fetch, requested_at=None):
+        """Run ``fetch`` and store its result, unless a fetch for ``key`` is already running.
+        
+        If a value was stored after ``requested_at`` (a time.monotonic() stamp
+        taken when the caller decided it needed one), it is returned as is.
+        """
+        if requested_at is None:
+            requested_at = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] >= requested_at:
+                return entry[0]
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+        
+        try:
+            flight.value = fetch()
+            self.set(key, flight.value)
+            return flight.value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+# One cache for all upstream snapshots, each with its own lifetime (set per source)
+cache = ExchangeRateCache()
+
+
+class SourceHealth:
+    """Outcome of the latest fetches from one upstream, with a circuit breaker.
+
+    After settings.rate_source_failure_threshold consecutive failures the
+    breaker opens and the source is not called for
+    settings.rate_source_cooldown_seconds; then a single probe is let through
+    and its outcome closes or re-opens the breaker.
+    """
     def __init__(self):
-        self.rate = None
-        self.last_update = None
+        self.last_success = None
+        self.last_error = None
+        self.consecutive_failures = 0
+        self.opened_at = None  # monotonic time the breaker opened, None while closed
+        self._probing = False
+        self._lock = threading.Lock()
+    
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        return 'half_open' if self.seconds_until_probe() == 0 else 'open'
+    
+    def seconds_until_probe(self) -> float:
+        if self.opened_at is None:
+            return 0
+        return max(0, self.opened_at + settings.rate_source_cooldown_seconds - time.monotonic())
     
-    def is_expired(self):
-        if self.last_update is None:
+    def allow(self) -> bool:
+        """Whether the source may be called now (claims the probe when half-open)"""
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if self._probing or self.seconds_until_probe() > 0:
+                return False
+            self._probing = True
             return True
-        cache_duration = timedelta(minutes=settings.exchange_rate_cache_minutes)
-        return datetime.now() - self.last_update > cache_duration
     
-    def get(self):
-        if not self.is_expired() and self.rate:
-            return self.rate
-        return None
+    def record_success(self):
+        with self._lock:
+            self.last_success = datetime.now()
+            self.consecutive_failures = 0
+            self.opened_at = None
+            self._probing = False
+    
+    def record_failure(self, error):
+        with self._lock:
+            self.last_error = str(error)
+            self.consecutive_failures += 1
+            if self._probing or self.consecutive_failures >= settings.rate_source_failure_threshold:
+                self.opened_at = time.monotonic()
+            self._probing = False
+    
+    def shared_state(self) -> dict:
+        """Fields shared with other workers through the rate snapshot file"""
+        return {
+            'last_success': self.last_success.isoformat() if self.last_success else None,
+            'last_error': self.last_error,
+            'consecutive_failures': self.consecutive_failures,
+        }
     
-    def set(self, rate):
-        self.rate = rate
-        self.last_update = datetime.now()
+    def load_state(self, state: dict):
+        with self._lock:
+            self.last_success = datetime.fromisoformat(state['last_success']) if state['last_success'] else None
+            self.last_error = state['last_error']
+            self.consecutive_failures = state['consecutive_failures']
+    
+    def to_dict(self):
+        return {
+            'healthy': self.last_success is not None and self.consecutive_failures == 0,
+            'age_seconds': round((datetime.now() - self.last_success).total_seconds(), 1) if self.last_success else None,
+            'consecutive_failures': self.consecutive_failures,
+            'last_error': self.last_error,
+            'breaker': self.state,
+        }
 
-# Create cache instance
-cache = ExchangeRateCache()
+source_health = {}
 
-# Separate cache for Bybit P2P snapshot (can be dict)
-bybit_p2p_cache = ExchangeRateCache()
+# One task per source; each source fetches its pages on the leaf pool, so the
+# two never wait on each other for a worker
+_source_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="rate-source")
+_page_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="rate-page")
 
 
 def _parse_decimal(value) -> Decimal:
@@ -41,8 +207,8 @@ def _parse_decimal(value) -> Decimal:
         return None
 
 
-def _fetch_bybit_p2p_prices(token_id: str, currency_id: str, side: str, size: int = 10):
-    """Fetch raw prices list from Bybit P2P public endpoint.
+def _fetch_bybit_p2p_ads(token_id: str, currency_id: str, side: str, page: int = 1, size: int = 10):
+    """Fetch one page of ads from Bybit P2P public endpoint as DepthLevels.
 
     Notes:
     - Bybit P2P endpoints are not officially stable; response shapes may vary.
@@ -58,7 +224,7 @@ def _fetch_bybit_p2p_prices(token_id: str, currency_id: str, side: str, size: in
         "payment": [],
         "side": str(side),
         "size": str(size),
-        "page": "1",
+        "page": str(page),
         "amount": "",
         "authMaker": False,
         "canTrade": False,
@@ -82,22 +248,59 @@ def _fetch_bybit_p2p_prices(token_id: str, currency_id: str, side: str, size: in
         if not isinstance(items, list):
             return []
 
-        prices = []
+        levels = []
         for item in items:
             if not isinstance(item, dict):
                 continue
-            price = item.get("price")
-            dec = _parse_decimal(price)
-            if dec is None:
+            price = _parse_decimal(item.get("price"))
+            if price is None or price <= 0:
                 continue
-            prices.append(dec)
+            # Ads without a quantity are still good for the top-of-book price
+            quantity = _parse_decimal(item.get("lastQuantity", item.get("quantity"))) or Decimal(0)
+            min_rub = _parse_decimal(item.get("minAmount")) or Decimal(0)
+            max_rub = _parse_decimal(item.get("maxAmount")) or Decimal(0)
+            levels.append(DepthLevel(price, quantity, min_rub, max_rub))
 
-        return prices
+        return levels
     except Exception as e:
-        logger.error(f"Error fetching Bybit P2P prices (side={side}): {e}")
+        logger.error(f"Error fetching Bybit P2P ads (side={side}, page={page}): {e}")
         return []
 
 
+def _fetch_bybit_p2p_snapshot():
+    """Fetch a fresh Bybit P2P snapshot for USDT/RUB (see get_bybit_p2p_usdt_rub_rates)"""
+    # All pages of both sides at once; one side holds sell offers, the other buy offers.
+    pages = range(1, settings.bybit_p2p_depth_pages + 1)
+    futures = {
+        side: [
+            _page_pool.submit(_fetch_bybit_p2p_ads, "USDT", "RUB", side=side, page=page, size=settings.bybit_p2p_page_size)
+            for page in pages
+        ]
+        for side in ("0", "1")
+    }
+    ads = {side: [level for future in side_futures for level in future.result()] for side, side_futures in futures.items()}
+
+    # Bybit's 'side' semantics can vary, so tell the sides apart by price:
+    # sell offers (asks) are priced above buy offers (bids).
+    def best(levels, pick):
+        return pick(level.price for level in levels) if levels else None
+
+    if ads["0"] and ads["1"] and best(ads["0"], min) < best(ads["1"], min):
+        asks, bids = ads["1"], ads["0"]
+    else:
+        asks, bids = ads["0"], ads["1"]
+    book = DepthBook(asks, bids)
+
+    buy_usdt = book.best(ASK)
+    sell_usdt = book.best(BID)
+    return {
+        "buy_usdt_rub": float(buy_usdt) if buy_usdt is not None else None,
+        "sell_usdt_rub": float(sell_usdt) if sell_usdt is not None else None,
+        "source": "bybit_p2p",
+        "depth": book,
+    }
+
+
 def get_bybit_p2p_usdt_rub_rates():
     """Get Bybit P2P snapshot for USDT/RUB.
 
@@ -112,120 +315,492 @@ def get_bybit_p2p_usdt_rub_rates():
     - buy_usdt_rub  as the lowest available sell-offer price (best for buying)
     - sell_usdt_rub as the highest available buy-offer price (best for selling)
     
-    Because Bybit's 'side' semantics can vary, we try both sides and then apply
-    min/max logic on the returned lists.
+    The snapshot also carries the order book ('depth', a DepthBook) used to
+    price orders by size.
+
+    The snapshot is kept fresh by the background refresher; a stale one is
+    returned rather than fetching inside the request.
     """
-    cached = bybit_p2p_cache.get()
-    if cached:
-        return cached
+    rate_refresher.start()
+    if cache.peek('bybit_p2p') is None:
+        # Cold start: nothing to serve yet
+        refresh_rates(['bybit_p2p'])
+    return cache.peek('bybit_p2p') or {"buy_usdt_rub": None, "sell_usdt_rub": None, "source": "bybit_p2p"}
 
-    # Try both sides; one usually corresponds to sell offers, the other to buy offers.
-    prices_side_0 = _fetch_bybit_p2p_prices("USDT", "RUB", side="0", size=10)
-    prices_side_1 = _fetch_bybit_p2p_prices("USDT", "RUB", side="1", size=10)
+def _fetch_coingecko_rate() -> Decimal:
+    """Fetch USDT/RUB from CoinGecko API (free, no auth needed); raises on failure"""
+    response = requests.get(
+        'https://api.coingecko.com/api/v3/simple/price',
+        params={
+            'ids': 'tether',
+            'vs_currencies': 'rub',
+            'include_market_cap': 'false',
+            'include_24hr_vol': 'false',
+            'include_24hr_change': 'false'
+        },
+        timeout=10
+    )
+    response.raise_for_status()
+    
+    data = response.json()
+    rate = Decimal(str(data['tether']['rub']))
+    logger.info(f"Fetched exchange rate from CoinGecko: 1 USDT = {rate} RUB")
+    return rate
 
-    buy_usdt = None
-    sell_usdt = None
 
-    # Heuristic:
-    # - buy_usdt should come from the side with cheaper prices (min)
-    # - sell_usdt should come from the side with more expensive prices (max)
+def _fetch_cbr_usd_rate() -> Decimal:
+    """Official USD/RUB rate of the Central Bank of Russia (USDT tracks USD); raises on failure"""
+    response = requests.get('https://www.cbr-xml-daily.ru/daily_json.js', timeout=10)
+    response.raise_for_status()
     
-    # Collect candidate mins/maxes
-    side0_min = min(prices_side_0) if prices_side_0 else None
-    side0_max = max(prices_side_0) if prices_side_0 else None
-    side1_min = min(prices_side_1) if prices_side_1 else None
-    side1_max = max(prices_side_1) if prices_side_1 else None
+    data = response.json()
+    usd = data['Valute']['USD']
+    rate = Decimal(str(usd['Value'])) / Decimal(str(usd['Nominal']))
+    logger.info(f"Fetched USD rate from CBR: 1 USD = {rate} RUB")
+    return rate
 
-    # Choose buy price as the smallest min among available sides
-    candidate_mins = [x for x in [side0_min, side1_min] if x is not None]
-    if candidate_mins:
-        buy_usdt = min(candidate_mins)
 
-    # Choose sell price as the largest max among available sides
-    candidate_maxs = [x for x in [side0_max, side1_max] if x is not None]
-    if candidate_maxs:
-        sell_usdt = max(candidate_maxs)
+class RateSource:
+    """A USDT/RUB upstream that can be plugged into the market rate.
 
-    result = {
-        "buy_usdt_rub": float(buy_usdt) if buy_usdt is not None else None,
-        "sell_usdt_rub": float(sell_usdt) if sell_usdt is not None else None,
-        "source": "bybit_p2p",
+    ``fetch`` returns a snapshot (anything cacheable) and raises on failure;
+    ``market_rate`` reduces a snapshot to the single rate used in the
+    aggregate, or None if the source should only be shown, not priced from.
+    """
+    def __init__(self, name: str, fetch, cache_seconds: float, market_rate=None):
+        self.name = name
+        self.fetch = fetch
+        self.cache_seconds = cache_seconds
+        self._market_rate = market_rate
+    
+    def market_rate(self, snapshot) -> Optional[Decimal]:
+        if snapshot is None:
+            return None
+        return self._market_rate(snapshot) if self._market_rate else snapshot
+
+
+def _bybit_p2p_mid(snapshot) -> Optional[Decimal]:
+    sides = [Decimal(str(snapshot[key])) for key in ('buy_usdt_rub', 'sell_usdt_rub') if snapshot.get(key) is not None]
+    return sum(sides) / len(sides) if sides else None
+
+
+def _fetch_bybit_p2p_checked():
+    snapshot = _fetch_bybit_p2p_snapshot()
+    if snapshot['buy_usdt_rub'] is None and snapshot['sell_usdt_rub'] is None:
+        raise ValueError("no prices returned")
+    return snapshot
+
+
+# Source name (also its cache key) -> RateSource
+SOURCES = {}
+
+
+def register_source(source: RateSource):
+    """Add a rate source; sources missing from settings.rate_sources are ignored"""
+    enabled = [name.strip() for name in settings.rate_sources.split(',') if name.strip()]
+    if source.name not in enabled:
+        return
+    SOURCES[source.name] = source
+    source_health[source.name] = SourceHealth()
+    cache.set_ttl(source.name, source.cache_seconds)
+
+
+register_source(RateSource('coingecko', _fetch_coingecko_rate, settings.exchange_rate_cache_minutes * 60))
+register_source(RateSource('bybit_p2p', _fetch_bybit_p2p_checked, settings.bybit_p2p_cache_minutes * 60, _bybit_p2p_mid))
+register_source(RateSource('cbr', _fetch_cbr_usd_rate, settings.cbr_cache_minutes * 60))
+
+
+def _refresh_source(name, requested_at):
+    try:
+        value = cache.fetch_once(name, SOURCES[name].fetch, requested_at)
+    except Exception as e:
+        source_health[name].record_failure(e)
+        logger.error(f"Error fetching {name} rate: {e}")
+        return None
+    source_health[name].record_success()
+    return value
+
+
+def refresh_rates(sources=None) -> list:
+    """Fetch upstreams concurrently and update the caches.
+
+    Waits at most settings.rate_fetch_deadline_seconds in total. Sources that
+    have not answered by then are marked unhealthy and returned; their fetch
+    keeps running and still updates the cache if it completes later. History
+    and the shared snapshot are only written when at least one source answered.
+    """
+    # Sources with an open circuit breaker are skipped instead of waited on
+    names = [name for name in (sources or SOURCES) if name in SOURCES and source_health[name].allow()]
+    requested_at = time.monotonic()
+    futures = {name: _source_pool.submit(_refresh_source, name, requested_at) for name in names}
+    _, not_done = wait(futures.values(), timeout=settings.rate_fetch_deadline_seconds)
+    missing = [name for name, future in futures.items() if future in not_done]
+    for name in missing:
+        source_health[name].record_failure("deadline exceeded")
+        logger.warning(f"Rate source {name} missed the {settings.rate_fetch_deadline_seconds}s deadline")
+    # Nothing new to record or publish unless some source answered this round
+    if any(future not in not_done and future.result() is not None for future in futures.values()):
+        if rate_refresher.is_leader:
+            _record_history()
+            save_shared_snapshot()
+        _invalidate_pricing_snapshot()
+    return missing
+
+
+# --- Snapshot shared between worker processes ------------------------------
+
+def _encode(value):
+    if isinstance(value, Decimal):
+        return {'decimal': str(value)}
+    if isinstance(value, DepthBook):
+        return {'depth': {side: [[str(field) for field in level] for level in levels] for side, levels in value.levels.items()}}
+    if isinstance(value, dict):
+        return {'dict': {key: _encode(item) for key, item in value.items()}}
+    return value
+
+
+def _decode(value):
+    if isinstance(value, dict):
+        if 'decimal' in value:
+            return Decimal(value['decimal'])
+        if 'depth' in value:
+            levels = {side: [DepthLevel(*map(Decimal, level)) for level in rows] for side, rows in value['depth'].items()}
+            return DepthBook(levels[ASK], levels[BID])
+        return {key: _decode(item) for key, item in value['dict'].items()}
+    return value
+
+
+def _shared_state() -> dict:
+    """Cached source values (with wall-clock fetch times) and source health"""
+    entries = {}
+    for name in SOURCES:
+        fetched_at = cache.fetched_at(name)
+        if fetched_at is not None:
+            entries[name] = {'fetched_at': fetched_at, 'value': _encode(cache.peek(name))}
+    return {
+        'entries': entries,
+        'health': {name: health.shared_state() for name, health in source_health.items()},
+    }
+
+
+def rates_version(state: dict = None) -> str:
+    """Content hash of the shared rate state; equal in every worker holding the same rates"""
+    state = state if state is not None else _shared_state()
+    return hashlib.sha1(json.dumps(state, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def save_shared_snapshot():
+    """Atomically write the cached rates for the other workers (refreshing process only)"""
+    path = runtime_path(settings.rate_snapshot_file)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"  # Concurrent refreshes must not share it
+    try:
+        with open(tmp_path, 'w') as handle:
+            json.dump(_shared_state(), handle)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        logger.error(f"Error writing rate snapshot: {e}")
+
+
+def load_shared_snapshot(since_mtime=None):
+    """Load the snapshot written by the refreshing process if it changed since ``since_mtime``.
+
+    Returns the file's mtime, so callers can poll cheaply; entries older than
+    what this process already has are ignored.
+    """
+    path = runtime_path(settings.rate_snapshot_file)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+        if mtime == since_mtime:
+            return mtime
+        with open(path) as handle:
+            state = json.load(handle)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.error(f"Error reading rate snapshot: {e}")
+        return since_mtime
+    
+    for name, entry in state['entries'].items():
+        if name not in SOURCES:
+            continue
+        current = cache.fetched_at(name)
+        if current is None or entry['fetched_at'] > current:
+            cache.set(name, _decode(entry['value']), fetched_at=entry['fetched_at'])
+    for name, health in state['health'].items():
+        if name in source_health:
+            source_health[name].load_state(health)
+    _invalidate_pricing_snapshot()
+    return mtime
+
+
+def _record_history():
+    """Append the current snapshot to the rate history (no-op outside the recording process)"""
+    bybit_p2p = cache.peek('bybit_p2p') or {}
+    try:
+        market_rate = aggregate_market_rate()['rate']
+    except RateUnavailableError:
+        market_rate = None
+    try:
+        rate_history.append({
+            'timestamp': time.time(),
+            'coingecko': cache.peek('coingecko'),
+            'bybit_buy': bybit_p2p.get('buy_usdt_rub'),
+            'bybit_sell': bybit_p2p.get('sell_usdt_rub'),
+            'buy_price': calculate_buy_price(market_rate) if market_rate is not None else None,
+            'sell_price': calculate_sell_price(market_rate) if market_rate is not None else None,
+        })
+    except Exception as e:
+        logger.error(f"Error recording rate history: {e}")
+
+
+REFRESHER_LOCK = "rate_refresher.lock"
+
+
+class RateRefresher:
+    """Background thread that renews the cached rates before they expire.
+
+    Requests always read whatever snapshot is cached (stale-while-revalidate),
+    so no request waits on an upstream once the first fetch has completed.
+    With several workers only one of them (holding REFRESHER_LOCK) calls the
+    upstreams and writes the shared snapshot file; the others load that file
+    when it changes and take over if the refreshing process goes away.
+    """
+    REFRESH_AHEAD = 0.8  # Refresh at 80% of the cache lifetime
+
+    def __init__(self):
+        self._thread = None
+        self._lock = threading.Lock()
+        self._owner = None
+        self._snapshot_mtime = None
+    
+    @property
+    def is_leader(self) -> bool:
+        return self._owner is not None
+    
+    def start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                # Serve the last good snapshot right away, even after a restart
+                self._snapshot_mtime = load_shared_snapshot()
+                self._try_lead()
+                self._thread = threading.Thread(target=self._run, name="rate-refresher", daemon=True)
+                self._thread.start()
+    
+    def _seconds_until_due(self, key) -> float:
+        age = cache.age_seconds(key)
+        due_in = 0 if age is None else cache.ttl(key) * self.REFRESH_AHEAD - age
+        return max(due_in, source_health[key].seconds_until_probe())
+    
+    def _try_lead(self) -> bool:
+        if self._owner is None:
+            self._owner = try_acquire(REFRESHER_LOCK)
+            if self._owner is not None:
+                logger.info("This process now refreshes exchange rates for all workers")
+        return self._owner is not None
+    
+    def _run(self):
+        while True:
+            if not self._try_lead():
+                self._snapshot_mtime = load_shared_snapshot(self._snapshot_mtime)
+                time.sleep(settings.rate_snapshot_poll_seconds)
+                continue
+            
+            due = [name for name in SOURCES if self._seconds_until_due(name) <= 0]
+            if due:
+                try:
+                    refresh_rates(due)
+                except Exception as e:
+                    logger.error(f"Error refreshing exchange rates: {e}")
+            # A failed source stays due; retry it after a short pause instead of hammering it
+            delay = min(self._seconds_until_due(name) for name in SOURCES)
+            time.sleep(max(delay, settings.api_retry_delay))
+
+rate_refresher = RateRefresher()
+
+
+def _median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    if len(values) % 2:
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2
+
+
+_last_rejected = []  # Only log when the set of rejected sources changes
+
+
+def aggregate_market_rate() -> dict:
+    """Combine the cached source rates into one market rate.
+
+    Rates older than settings.rate_max_age_minutes are left out. The result is
+    the median of the rates within settings.rate_outlier_tolerance of the
+    median of all of them, so a single misbehaving source cannot move it.
+    Raises RateUnavailableError if no source has a usable rate, or if the
+    sources disagree so much that none is near the median (e.g. two sources
+    further than twice the tolerance apart): there is no telling which is right.
+    """
+    rates = {}
+    oldest = None
+    for name, source in SOURCES.items():
+        age = cache.age_seconds(name)
+        if age is None or age > settings.rate_max_age_minutes * 60:
+            continue
+        rate = source.market_rate(cache.peek(name))
+        if rate is not None and rate > 0:
+            rates[name] = rate
+            oldest = age if oldest is None else max(oldest, age)
+    
+    if not rates:
+        raise RateUnavailableError("No exchange rate source is available")
+    
+    center = _median(rates.values())
+    tolerance = center * Decimal(str(settings.rate_outlier_tolerance))
+    used = {name: rate for name, rate in rates.items() if abs(rate - center) <= tolerance}
+    rejected = sorted(set(rates) - set(used))
+    global _last_rejected
+    if rejected != _last_rejected:
+        _last_rejected = rejected
+        if rejected:
+            logger.warning(f"Rejected outlier rates {[(name, str(rates[name])) for name in rejected]} around {center}")
+    if not used:
+        raise RatesDisagreeError(f"Exchange rate sources disagree: {[(name, str(rate)) for name, rate in rates.items()]}")
+    
+    return {
+        'rate': _median(used.values()).quantize(Decimal('0.0001')),
+        'sources': {name: float(rate) for name, rate in rates.items()},
+        'rejected': rejected,
+        'age_seconds': oldest,
     }
-    bybit_p2p_cache.set(result)
-    return result
+
 
 def get_usdt_rub_rate() -> Decimal:
     """
-    Fetch current USDT/RUB exchange rate from CoinGecko API (free, no auth needed)
+    Get current USDT/RUB market rate (aggregate of all rate sources)
     Returns Decimal price of 1 USDT in RUB
-    """
-    # Check cache first
-    cached_rate = cache.get()
-    if cached_rate:
-        logger.info(f"Using cached exchange rate: {cached_rate}")
-        return cached_rate
     
+    Served from the cache kept fresh by the background refresher (or loaded
+    from the snapshot shared by another worker); only a process without any
+    usable rate fetches inline, and sources that are merely missing are left
+    to the refresher. Raises RateUnavailableError rather than guessing a rate
+    when no source has answered.
+    """
+    rate_refresher.start()
     try:
-        # Use CoinGecko API (free, no API key needed)
-        response = requests.get(
-            'https://api.coingecko.com/api/v3/simple/price',
-            params={
-                'ids': 'tether',
-                'vs_currencies': 'rub',
-                'include_market_cap': 'false',
-                'include_24hr_vol': 'false',
-                'include_24hr_change': 'false'
-            },
-            timeout=10
-        )
-        response.raise_for_status()
-        
-        data = response.json()
-        rate = Decimal(str(data['tether']['rub']))
-        
-        # Cache the rate
-        cache.set(rate)
-        logger.info(f"Fetched exchange rate from CoinGecko: 1 USDT = {rate} RUB")
-        return rate
-        
-    except Exception as e:
-        logger.error(f"Error fetching exchange rate: {e}")
-        # Return fallback rate if API fails
-        fallback_rate = Decimal('95.0')  # Approximate rate as fallback
-        logger.warning(f"Using fallback rate: {fallback_rate} RUB")
-        return fallback_rate
+        return aggregate_market_rate()['rate']
+    except RatesDisagreeError:
+        raise  # Fetching again now would not settle it; the refresher keeps trying
+    except RateUnavailableError:
+        # Cold start (or every rate too old): fetch all sources in one concurrent round
+        refresh_rates()
+    return aggregate_market_rate()['rate']
+
+def _depth_impact(side: str, amount_usdt=None, amount_rub=None) -> Decimal:
+    """Relative price impact of filling the amount against the Bybit P2P book.
 
-def calculate_buy_price(exchange_rate: Decimal = None) -> Decimal:
+    1 for orders that the best ad can fill, above 1 for large buys and below 1
+    for large sells. Raises InsufficientLiquidityError if the book is too thin.
+    """
+    if not amount_usdt and not amount_rub:
+        return Decimal(1)
+    snapshot = cache.peek('bybit_p2p')
+    book = snapshot.get('depth') if snapshot else None
+    best = book.best(side) if book else None
+    if best is None:
+        # No depth to go by: price like any other order
+        return Decimal(1)
+    return book.vwap(side, amount_usdt, amount_rub) / best
+
+
+def calculate_buy_price(exchange_rate: Decimal = None, amount_usdt=None, amount_rub=None) -> Decimal:
     """
     Calculate the price we charge users when they buy USDT from us
-    Formula: exchange_rate * (1 + buy_margin)
+    Formula: exchange_rate * depth_impact * (1 + buy_margin)
+    
+    With an order size, the rate is moved by the slippage of filling that
+    size against the P2P sell offers.
     """
     if exchange_rate is None:
         exchange_rate = get_usdt_rub_rate()
     
-    buy_price = exchange_rate * (Decimal(1) + Decimal(str(settings.buy_margin)))
+    rate = exchange_rate * _depth_impact(ASK, amount_usdt, amount_rub)
+    buy_price = rate * (Decimal(1) + Decimal(str(settings.buy_margin)))
     return buy_price.quantize(Decimal('0.01'))
 
-def calculate_sell_price(exchange_rate: Decimal = None) -> Decimal:
+def calculate_sell_price(exchange_rate: Decimal = None, amount_usdt=None, amount_rub=None) -> Decimal:
     """
     Calculate the price we pay users when they sell USDT to us
-    Formula: exchange_rate * (1 - sell_margin)
+    Formula: exchange_rate * depth_impact * (1 - sell_margin)
+    
+    With an order size, the rate is moved by the slippage of filling that
+    size against the P2P buy offers.
     """
     if exchange_rate is None:
         exchange_rate = get_usdt_rub_rate()
     
-    sell_price = exchange_rate * (Decimal(1) - Decimal(str(settings.sell_margin)))
+    rate = exchange_rate * _depth_impact(BID, amount_usdt, amount_rub)
+    sell_price = rate * (Decimal(1) - Decimal(str(settings.sell_margin)))
     return sell_price.quantize(Decimal('0.01'))
 
-def get_pricing_info():
-    """Get current pricing information"""
+def quote_order(order_type: str, amount_usdt=None, amount_rub=None, market_rate: Decimal = None) -> dict:
+    """Price an order given either amount and derive the other one.
+
+    Sells are sized in USDT and buys in RUB when both amounts are given.
+    Raises ValueError for a bad request, InsufficientLiquidityError or
+    RateUnavailableError when it cannot be priced.
+    """
+    if order_type not in ('buy', 'sell'):
+        raise ValueError("type must be 'buy' or 'sell'")
+    if not amount_usdt and not amount_rub:
+        raise ValueError("amount_usdt or amount_rub is required")
+    
+    if market_rate is None:
+        market_rate = get_usdt_rub_rate()
+    calculate = calculate_sell_price if order_type == 'sell' else calculate_buy_price
+    if amount_usdt and (order_type == 'sell' or not amount_rub):
+        price = calculate(market_rate, amount_usdt=amount_usdt)
+        amount_rub = float(Decimal(str(amount_usdt)) * price)
+    else:
+        price = calculate(market_rate, amount_rub=amount_rub)
+        amount_usdt = float(Decimal(str(amount_rub)) / price)
+    
+    return {
+        'type': order_type,
+        'amount_usdt': float(amount_usdt),
+        'amount_rub': float(amount_rub),
+        'price': float(price),
+        'market_rate': float(market_rate),
+    }
+
+def quote_orders(orders) -> list:
+    """Price many (type, amount_usdt, amount_rub) orders against one market rate.
+
+    An order that cannot be priced (bad input, too large for the book) gets
+    an 'error' entry instead of failing the batch; RateUnavailableError is
+    still raised for the whole batch.
+    """
+    market_rate = get_usdt_rub_rate()
+    quotes = []
+    for order_type, amount_usdt, amount_rub in orders:
+        try:
+            quotes.append(quote_order(order_type, amount_usdt, amount_rub, market_rate))
+        except ValueError as e:  # Includes InsufficientLiquidityError
+            quotes.append({'type': order_type, 'amount_usdt': amount_usdt, 'amount_rub': amount_rub, 'error': str(e)})
+    return quotes
+
+def _pricing_rates():
+    """The part of the pricing info that only changes with the rates, and the age of the oldest rate"""
     exchange_rate = get_usdt_rub_rate()
+    market = aggregate_market_rate()
+    coingecko = cache.peek('coingecko')
     buy_price = calculate_buy_price(exchange_rate)
     sell_price = calculate_sell_price(exchange_rate)
 
     bybit_p2p = get_bybit_p2p_usdt_rub_rates()
+    depth = bybit_p2p.get('depth')
     
-    return {
+    rates = {
         'market_rate': float(exchange_rate),
         'buy_price': float(buy_price),  # Price per USDT when user buys
         'sell_price': float(sell_price),  # Price per USDT when user sells
@@ -234,7 +809,104 @@ def get_pricing_info():
         'spread': float((buy_price - sell_price).quantize(Decimal('0.01'))),
 
         # Extra info for UI (header): external snapshots
-        'coingecko_usdt_rub': float(exchange_rate),
+        'coingecko_usdt_rub': float(coingecko) if coingecko is not None else None,
         'bybit_p2p_buy_usdt_rub': bybit_p2p.get('buy_usdt_rub'),
         'bybit_p2p_sell_usdt_rub': bybit_p2p.get('sell_usdt_rub'),
+        'max_buy_usdt': float(depth.liquidity_usdt(ASK)) if depth else None,  # Largest order the book can price
+        'max_sell_usdt': float(depth.liquidity_usdt(BID)) if depth else None,
+        'market_rate_sources': market['sources'],
+        'rejected_sources': market['rejected'],
+    }
+    return rates, market['age_seconds']
+
+
+def _pricing_status(rates_age_seconds: float) -> dict:
+    """Staleness of the cached snapshot and health of each upstream, as of now"""
+    return {
+        'rates_age_seconds': round(rates_age_seconds, 1),
+        'sources': {name: health.to_dict() for name, health in source_health.items()},
+        'missing_sources': [name for name, health in source_health.items() if not health.to_dict()['healthy']],
     }
+
+
+def get_pricing_info():
+    """Get current pricing information"""
+    rates, rates_age = _pricing_rates()
+    return {**rates, **_pricing_status(rates_age)}
+
+
+class PricingSnapshot(NamedTuple):
+    generation: int  # Refresh round the snapshot was built for
+    body: bytes  # Rates part of get_pricing_info() as JSON; see pricing_body()
+    etag: str
+    built_at: float  # time.monotonic()
+    rates_age: float  # Age of the oldest rate in it when built
+    expires_at: float  # time.monotonic() when that rate passes rate_max_age_minutes
+
+    def rates_age_seconds(self) -> float:
+        return self.rates_age + time.monotonic() - self.built_at
+
+
+_pricing_generation = 0
+_pricing_snapshot = None
+_pricing_lock = threading.Lock()
+
+
+def _invalidate_pricing_snapshot():
+    global _pricing_generation
+    _pricing_generation += 1
+
+
+def _is_current(snapshot: Optional[PricingSnapshot]) -> bool:
+    return (
+        snapshot is not None
+        and snapshot.generation == _pricing_generation
+        and time.monotonic() < snapshot.expires_at
+    )
+
+
+def get_pricing_snapshot() -> PricingSnapshot:
+    """The rates part of get_pricing_info(), serialized once per refresh round.
+
+    A snapshot is rebuilt after the next refresh round, and also once its
+    oldest rate passes settings.rate_max_age_minutes, so /pricing stops
+    serving prices that orders would refuse. The ETag is weak and derived from
+    the shared rate state, so every worker holding the same rates hands out
+    the same tag even though the ages in the body differ. Raises
+    RateUnavailableError like get_pricing_info.
+    """
+    global _pricing_snapshot
+    snapshot = _pricing_snapshot
+    if _is_current(snapshot):
+        return snapshot
+    with _pricing_lock:
+        snapshot = _pricing_snapshot
+        if _is_current(snapshot):
+            return snapshot
+        generation = _pricing_generation
+        rates, rates_age = _pricing_rates()
+        built_at = time.monotonic()
+        snapshot = PricingSnapshot(
+            generation,
+            json.dumps(rates, separators=(',', ':')).encode(),
+            f'W/"{rates_version()}"',
+            built_at,
+            rates_age,
+            built_at + settings.rate_max_age_minutes * 60 - rates_age,
+        )
+        _pricing_snapshot = snapshot
+        return snapshot
+
+
+def pricing_body(snapshot: PricingSnapshot) -> bytes:
+    """Full /pricing JSON: the cached rates with ages and source health filled in as of now"""
+    status = json.dumps(_pricing_status(snapshot.rates_age_seconds()), separators=(',', ':')).encode()
+    return snapshot.body[:-1] + b',' + status[1:]
+
+
+def pricing_cache_control(snapshot: PricingSnapshot) -> str:
+    """Cache-Control for a snapshot: fresh until the next refresh round is due (or its rates get too old)"""
+    interval = min((cache.ttl(name) for name in SOURCES), default=cache.ttl(None)) * RateRefresher.REFRESH_AHEAD
+    now = time.monotonic()
+    max_age = max(0, int(min(interval - (now - snapshot.built_at), snapshot.expires_at - now)))
+    return f"public, max-age={max_age}, stale-while-revalidate={int(interval)}"
@@ -0,0 +1,24 @@
+import threading
+
+
+class LazySingleton:
+    """Creates a shared instance on first call instead of at import time.
+
+    A failed creation is not cached, so the next call tries again.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._instance = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._instance is not None
+
+    def __call__(self):
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    self._instance = self._factory()
+        return self._instance
@@ -0,0 +1,75 @@
+"""Bybit P2P order book depth and volume-weighted fills"""
+from decimal import Decimal
+from typing import List, NamedTuple, Optional
+
+ASK = 'ask'  # Ads selling USDT: what a buyer of USDT pays
+BID = 'bid'  # Ads buying USDT: what a seller of USDT receives
+
+
+class InsufficientLiquidityError(ValueError):
+    """The order book cannot fill the requested amount"""
+
+
+class DepthLevel(NamedTuple):
+    price: Decimal  # RUB per USDT
+    quantity: Decimal  # USDT available on the ad
+    min_rub: Decimal  # Smallest order the ad accepts (0 = no limit)
+    max_rub: Decimal  # Largest order the ad accepts (0 = no limit)
+
+    @property
+    def capacity_rub(self) -> Decimal:
+        """Most RUB a single order can trade against this ad"""
+        available = self.quantity * self.price
+        return min(available, self.max_rub) if self.max_rub else available
+
+
+class DepthBook:
+    """Both sides of the book, best price first"""
+
+    def __init__(self, asks: List[DepthLevel], bids: List[DepthLevel]):
+        self.levels = {
+            ASK: sorted(asks, key=lambda level: level.price),
+            BID: sorted(bids, key=lambda level: level.price, reverse=True),
+        }
+
+    def best(self, side: str) -> Optional[Decimal]:
+        levels = self.levels[side]
+        return levels[0].price if levels else None
+
+    def liquidity_usdt(self, side: str) -> Decimal:
+        return sum((level.capacity_rub / level.price for level in self.levels[side]), Decimal(0))
+
+    def vwap(self, side: str, amount_usdt: Decimal = None, amount_rub: Decimal = None) -> Decimal:
+        """Average price of filling ``amount_usdt`` (or ``amount_rub``) by walking ``side`` from the best ad.
+
+        Each ad contributes at most its available quantity and max limit. The
+        first chunk always goes to the best ad, so small orders price at the
+        top of the book; after that, ads whose minimum order is larger than
+        the chunk they would take are skipped.
+        """
+        if amount_usdt is None and amount_rub is None:
+            raise ValueError("amount_usdt or amount_rub is required")
+        in_rub = amount_usdt is None
+        remaining = Decimal(str(amount_rub if in_rub else amount_usdt))
+        if remaining <= 0:
+            raise ValueError("amount must be positive")
+        total = remaining
+        filled_rub = Decimal(0)
+        filled_usdt = Decimal(0)
+
+        for level in self.levels[side]:
+            capacity = level.capacity_rub if in_rub else level.capacity_rub / level.price
+            take = min(remaining, capacity)
+            take_rub = take if in_rub else take * level.price
+            if filled_usdt and take_rub < level.min_rub:
+                continue
+            filled_rub += take_rub
+            filled_usdt += take_rub / level.price
+            remaining -= take
+            if remaining <= 0:
+                break
+
+        if remaining > 0:
+            unit = 'RUB' if in_rub else 'USDT'
+            raise InsufficientLiquidityError(f"Order book can fill only {total - remaining:.2f} of {total:.2f} {unit}")
+        return filled_rub / filled_usdt
@@ -0,0 +1,59 @@
+"""File locks shared between the API workers and the bot process"""
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from ..config import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines: fall back to in-process locking only
+    fcntl = None
+
+_thread_locks = {}
+_thread_locks_guard = threading.Lock()
+
+
+def runtime_path(name: str) -> Path:
+    """Path of a file in the runtime directory (created on first use)"""
+    directory = Path(settings.runtime_dir)
+    directory.mkdir(parents=True, exist_ok=True)
+    return directory / name
+
+
+def _thread_lock(path: Path) -> threading.Lock:
+    with _thread_locks_guard:
+        return _thread_locks.setdefault(str(path), threading.Lock())
+
+
+@contextmanager
+def locked(name: str):
+    """Hold an exclusive lock on runtime file ``name`` across threads and processes"""
+    path = runtime_path(name)
+    with _thread_lock(path):
+        if fcntl is None:
+            yield
+            return
+        with open(path, 'a+') as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def try_acquire(name: str):
+    """Try to become the single owner of runtime file ``name``.
+
+    Returns an open handle that keeps the lock until it is closed (or the
+    process exits), or None if another process already owns it.
+    """
+    path = runtime_path(name)
+    handle = open(path, 'a+')
+    if fcntl is None:
+        return handle
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return None
+    return handle
@@ -0,0 +1,78 @@
+"""Token-bucket governor for the Google Sheets API quota.
+
+The API workers and the bot process share one budget: bucket state lives in
+a small JSON file in settings.runtime_dir and is only touched under a file
+lock. Callers that find the bucket empty wait for it to refill instead of
+failing. Lower-priority callers also leave a reserve untouched, so order
+writes still go through while admin listings and cache refreshes queue.
+"""
+import json
+import logging
+import time
+from .process_lock import locked, runtime_path
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_HIGH = 0    # order creation and status updates
+PRIORITY_NORMAL = 1  # targeted lookups and delta syncs
+PRIORITY_LOW = 2     # full-sheet reads and admin listings
+
+# Share of each bucket that callers of a given priority must leave untouched
+RESERVE = {PRIORITY_HIGH: 0.0, PRIORITY_NORMAL: 0.1, PRIORITY_LOW: 0.3}
+
+
+class QuotaGovernor:
+    def __init__(self, name: str, per_minute: dict):
+        self.name = name
+        self.capacity = {kind: float(limit) for kind, limit in per_minute.items()}
+
+    @property
+    def _state_file(self):
+        return runtime_path(f"{self.name}_quota.json")
+
+    def _load(self, now: float) -> dict:
+        try:
+            state = json.loads(self._state_file.read_text())
+        except (OSError, ValueError):
+            state = {}
+        buckets = {}
+        for kind, capacity in self.capacity.items():
+            bucket = state.get(kind) or {'tokens': capacity, 'updated': now}
+            refill = (now - bucket['updated']) * capacity / 60.0
+            buckets[kind] = {'tokens': min(capacity, bucket['tokens'] + max(0.0, refill)), 'updated': now}
+        return buckets
+
+    def _save(self, buckets: dict):
+        self._state_file.write_text(json.dumps(buckets))
+
+    def acquire(self, kind: str, priority: int = PRIORITY_NORMAL) -> float:
+        """Take one token from the ``kind`` bucket, waiting as long as needed.
+
+        Returns the number of seconds spent waiting.
+        """
+        capacity = self.capacity[kind]
+        reserve = capacity * RESERVE.get(priority, 0.0)
+        waited = 0.0
+        while True:
+            with locked(f"{self.name}_quota.lock"):
+                now = time.time()
+                buckets = self._load(now)
+                bucket = buckets[kind]
+                if bucket['tokens'] - reserve >= 1:
+                    bucket['tokens'] -= 1
+                    self._save(buckets)
+                    if waited >= 1:
+                        logger.info(f"{self.name} {kind} call waited {waited:.1f}s for quota (priority {priority})")
+                    return waited
+                self._save(buckets)
+                wait = (1 + reserve - bucket['tokens']) * 60.0 / capacity
+            wait = min(max(wait, 0.05), 5.0)
+            time.sleep(wait)
+            waited += wait
+
+    def drain(self, kind: str):
+        """Empty a bucket after the server reported the quota exhausted (HTTP 429)"""
+        with locked(f"{self.name}_quota.lock"):
+            buckets = self._load(time.time())
+            buckets[kind]['tokens'] = 0.0
+            self._save(buckets)
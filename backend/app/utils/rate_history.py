@@ -0,0 +1,212 @@
+"""Time series of the rates we fetched and quoted.
+
+Samples live in a fixed-size ring buffer kept as one ``array('d')`` per
+column, mirrored to a binary file in the runtime directory: a small header
+followed by ``capacity`` fixed-size records. Appending overwrites a single
+record in place, so the file never grows and a restart picks up where the
+previous process stopped. One process (whichever holds the writer lock)
+records samples; the others reload the file when it changes.
+"""
+import logging
+import math
+import os
+import struct
+import threading
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timezone
+from ..config import settings
+from .process_lock import runtime_path, try_acquire
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = ('timestamp', 'coingecko', 'bybit_buy', 'bybit_sell', 'buy_price', 'sell_price')
+VALUE_COLUMNS = COLUMNS[1:]
+
+MAGIC = b'RHS1'
+HEADER = struct.Struct('<4sIIQ')  # magic, capacity, column count, samples ever appended
+RECORD = struct.Struct(f"<{len(COLUMNS)}d")
+
+WRITER_LOCK = "rate_history.lock"
+MAX_BUCKETS = 2000
+
+
+class RateHistory:
+    """Ring buffer of rate samples with OHLC downsampling"""
+
+    def __init__(self, path, capacity: int):
+        self.path = path
+        self.capacity = capacity
+        self._columns = {}
+        self._total = 0
+        self._mtime = None
+        self._lock = threading.Lock()
+        self._owner = None
+        self._handle = None
+        self._load()
+
+    # --- storage -----------------------------------------------------------
+
+    def _reset(self):
+        self._columns = {name: array('d', bytes(8 * self.capacity)) for name in COLUMNS}
+        self._total = 0
+
+    def _load(self):
+        self._reset()
+        try:
+            with open(self.path, 'rb') as handle:
+                data = handle.read()
+            self._mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return
+
+        if len(data) < HEADER.size:
+            return
+        magic, capacity, ncols, total = HEADER.unpack_from(data)
+        if magic != MAGIC or ncols != len(COLUMNS) or len(data) < HEADER.size + capacity * RECORD.size:
+            logger.warning(f"Ignoring unreadable rate history file {self.path}")
+            return
+
+        values = array('d', data[HEADER.size:HEADER.size + capacity * RECORD.size])
+        columns = {name: values[i::len(COLUMNS)] for i, name in enumerate(COLUMNS)}
+
+        if capacity == self.capacity:
+            self._columns = columns
+            self._total = total
+            return
+
+        # Capacity changed: keep the newest samples that still fit
+        logger.info(f"Resizing rate history from {capacity} to {self.capacity} samples")
+        count = min(total, capacity)
+        head = total % capacity
+        keep = min(count, self.capacity)
+        for name, column in columns.items():
+            ordered = column[head:count] + column[:head] if total > capacity else column[:count]
+            self._columns[name][:keep] = ordered[count - keep:]
+        self._total = keep
+
+    def _write_all(self):
+        values = array('d', [0.0] * (self.capacity * len(COLUMNS)))
+        for i, name in enumerate(COLUMNS):
+            values[i::len(COLUMNS)] = self._columns[name]
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'wb') as handle:
+            handle.write(HEADER.pack(MAGIC, self.capacity, len(COLUMNS), self._total))
+            handle.write(values.tobytes())
+        os.replace(tmp_path, self.path)
+
+    def _open_for_writing(self) -> bool:
+        """Become the single writer; rewrites the file if it is missing or was resized"""
+        if self._handle is not None:
+            return True
+        if self._owner is None:
+            self._owner = try_acquire(WRITER_LOCK)
+            if self._owner is None:
+                return False
+        self._load()
+        try:
+            with open(self.path, 'rb') as handle:
+                magic, capacity, _, total = HEADER.unpack(handle.read(HEADER.size))
+            current = magic == MAGIC and capacity == self.capacity and total == self._total
+        except (FileNotFoundError, struct.error):
+            current = False
+        if not current:
+            self._write_all()
+        self._handle = open(self.path, 'r+b')
+        return True
+
+    def _refresh_from_disk(self):
+        """Readers in other processes pick up samples written by the recording process"""
+        if self._handle is not None:
+            return
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime != self._mtime:
+            self._load()
+
+    # --- public API --------------------------------------------------------
+
+    def append(self, sample: dict) -> bool:
+        """Record one sample; returns False if another process is the recorder"""
+        with self._lock:
+            if not self._open_for_writing():
+                return False
+            slot = self._total % self.capacity
+            row = []
+            for name in COLUMNS:
+                value = sample.get(name)
+                value = math.nan if value is None else float(value)
+                self._columns[name][slot] = value
+                row.append(value)
+            self._total += 1
+
+            self._handle.seek(HEADER.size + slot * RECORD.size)
+            self._handle.write(RECORD.pack(*row))
+            self._handle.seek(0)
+            self._handle.write(HEADER.pack(MAGIC, self.capacity, len(COLUMNS), self._total))
+            self._handle.flush()
+            return True
+
+    def __len__(self):
+        return min(self._total, self.capacity)
+
+    def _ordered(self, name) -> array:
+        """Column in chronological order"""
+        column = self._columns[name]
+        if self._total <= self.capacity:
+            return column[:self._total]
+        head = self._total % self.capacity
+        return column[head:] + column[:head]
+
+    def ohlc(self, start: float, end: float, step: float) -> list:
+        """Open/high/low/close per column for each ``step``-second bucket in [start, end)"""
+        with self._lock:
+            self._refresh_from_disk()
+            timestamps = self._ordered('timestamp')
+            lo = bisect_left(timestamps, start)
+            hi = bisect_left(timestamps, end, lo)
+            columns = {name: self._ordered(name)[lo:hi] for name in VALUE_COLUMNS}
+            timestamps = timestamps[lo:hi]
+
+        buckets = []
+        first = 0
+        bucket_start = start - start % step  # Align buckets to whole steps
+        while first < len(timestamps) and bucket_start < end:
+            bucket_end = bucket_start + step
+            last = bisect_left(timestamps, bucket_end, first)
+            if last > first:
+                bucket = {
+                    'time': datetime.fromtimestamp(bucket_start, tz=timezone.utc).isoformat(),
+                    'samples': last - first,
+                }
+                for name, column in columns.items():
+                    values = [v for v in column[first:last] if not math.isnan(v)]
+                    bucket[name] = {
+                        'open': values[0],
+                        'high': max(values),
+                        'low': min(values),
+                        'close': values[-1],
+                    } if values else None
+                buckets.append(bucket)
+            first = last
+            bucket_start = bucket_end
+        return buckets
+
+
+rate_history = RateHistory(runtime_path(settings.rate_history_file), settings.rate_history_capacity)
+
+
+def get_rate_history(start: datetime, end: datetime, step_seconds: int) -> dict:
+    """OHLC buckets between two aware datetimes"""
+    if end <= start:
+        raise ValueError("'to' must be after 'from'")
+    if (end - start).total_seconds() / step_seconds > MAX_BUCKETS:
+        raise ValueError(f"Too many buckets; use a larger step (max {MAX_BUCKETS} buckets)")
+    return {
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'step': step_seconds,
+        'buckets': rate_history.ohlc(start.timestamp(), end.timestamp(), step_seconds),
+    }
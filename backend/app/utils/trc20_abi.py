@@ -0,0 +1,50 @@
+"""ABI of the TRC-20 USDT contract (settings.usdt_trc20_contract).
+
+Bundled so the wallet does not have to download the contract from TronGrid
+on every start. Only the entries we use are included; TronWallet compares
+them against the on-chain ABI in the background.
+"""
+
+TRC20_ABI = [
+    {
+        "type": "Function",
+        "name": "balanceOf",
+        "stateMutability": "View",
+        "inputs": [{"name": "who", "type": "address"}],
+        "outputs": [{"type": "uint256"}],
+    },
+    {
+        "type": "Function",
+        "name": "transfer",
+        "stateMutability": "Nonpayable",
+        "inputs": [
+            {"name": "_to", "type": "address"},
+            {"name": "_value", "type": "uint256"},
+        ],
+        "outputs": [{"type": "bool"}],
+    },
+    {
+        "type": "Function",
+        "name": "decimals",
+        "stateMutability": "View",
+        "outputs": [{"type": "uint8"}],
+    },
+    {
+        "type": "Event",
+        "name": "Transfer",
+        "inputs": [
+            {"indexed": True, "name": "from", "type": "address"},
+            {"indexed": True, "name": "to", "type": "address"},
+            {"name": "value", "type": "uint256"},
+        ],
+    },
+]
+
+
+def abi_signatures(abi) -> dict:
+    """Map entry name -> tuple of input types, for comparing two ABIs"""
+    return {
+        entry.get("name"): tuple(param.get("type") for param in entry.get("inputs", []))
+        for entry in abi
+        if entry.get("name")
+    }
@@ -1,16 +1,25 @@
 from tronpy import Tron
-from tronpy.providers import HTTPProvider
+from tronpy.contract import Contract
 from tronpy.keys import PrivateKey
+from concurrent.futures import ThreadPoolExecutor
 from decimal import Decimal
 from ..config import settings
+from .lazy import LazySingleton
+from .trc20_abi import TRC20_ABI, abi_signatures
+from .trongrid import PooledHTTPProvider, get_trongrid
+from .block_height import block_height
+from ..storage import get_tx_finality_store
 import logging
 import time
 import os
-import requests
+import threading
 from functools import wraps
 
 logger = logging.getLogger(__name__)
 
+# Bounded parallelism for balance lookups across many addresses
+_balance_pool = ThreadPoolExecutor(max_workers=settings.tron_balance_concurrency, thread_name_prefix="usdt-balance")
+
 def retry_on_rate_limit(func):
     """Decorator to retry on rate limit errors with exponential backoff"""
     @wraps(func)
@@ -43,43 +52,56 @@ class TronWallet:
         logger.info(f"Initializing TronWallet for mainnet")
         
         try:
-            # Create custom HTTP provider with API key in headers
             if settings.trongrid_api_key:
                 print(f"✅ TronGrid API key found: {settings.trongrid_api_key[:10]}...")
                 logger.info(f"TronGrid API key found in settings")
                 logger.info(f"API key length: {len(settings.trongrid_api_key)}")
                 logger.info(f"API key starts with: {settings.trongrid_api_key[:10]}...")
-                
-                # Create HTTPProvider with custom headers
-                provider = HTTPProvider(
-                    endpoint_uri='https://api.trongrid.io',
-                    api_key=settings.trongrid_api_key
-                )
-                
-                print(f"✅ Created HTTPProvider with API key")
-                logger.info(f"Created HTTPProvider with API key")
-                logger.info(f"Provider endpoint: {provider.endpoint_uri}")
-                
-                # Initialize Tron client with custom provider
-                self.client = Tron(provider=provider)
-                print(f"✅ Tron client created with authenticated provider")
-                logger.info(f"✅ Tron client created with authenticated provider")
             else:
                 print("⚠️ No TronGrid API key configured - using free tier")
                 logger.warning("⚠️ No TronGrid API key configured. Using free tier (rate limited).")
                 logger.warning("Set TRONGRID_API_KEY in .env file")
-                self.client = Tron(network='mainnet')
+            
+            # tronpy shares the pooled keep-alive connections of the TronGrid client
+            provider = PooledHTTPProvider()
+            logger.info(f"Provider endpoint: {provider.endpoint_uri}")
+            self.client = Tron(provider=provider)
+            logger.info(f"✅ Tron client created with pooled provider")
             
             logger.info(f"Tron client created: {type(self.client)}")
             logger.info(f"Tron client provider: {type(self.client.provider)}")
             
-            # USDT TRC-20 contract
+            # USDT TRC-20 contract, from the bundled ABI (no network round trip)
             logger.info(f"Loading USDT contract: {settings.usdt_trc20_contract}")
-            self.usdt_contract = self._get_contract_with_retry(settings.usdt_trc20_contract)
-            logger.info("USDT contract loaded successfully")
+            self.usdt_contract = Contract(
+                addr=settings.usdt_trc20_contract,
+                abi=TRC20_ABI,
+                client=self.client
+            )
+            logger.info("USDT contract loaded from bundled ABI")
         except Exception as e:
             logger.error(f"Failed to initialize USDT contract: {e}")
             self.usdt_contract = None
+        
+        if self.usdt_contract is not None and settings.verify_usdt_abi:
+            threading.Thread(target=self._verify_usdt_abi, name="usdt-abi-check", daemon=True).start()
+    
+    def _verify_usdt_abi(self):
+        """Compare the bundled ABI with the on-chain contract (runs once, in the background)"""
+        try:
+            on_chain = abi_signatures(self._get_contract_with_retry(settings.usdt_trc20_contract).abi)
+        except Exception as e:
+            logger.warning(f"Could not verify bundled USDT ABI against the chain: {e}")
+            return
+        
+        mismatched = [
+            name for name, inputs in abi_signatures(TRC20_ABI).items()
+            if on_chain.get(name) != inputs
+        ]
+        if mismatched:
+            logger.error(f"❌ Bundled USDT ABI does not match contract {settings.usdt_trc20_contract}: {mismatched}")
+        else:
+            logger.info("✅ Bundled USDT ABI matches the on-chain contract")
     
     def _get_contract_with_retry(self, address):
         """Get contract with retry logic for rate limiting"""
@@ -109,7 +131,9 @@ class TronWallet:
                     if attempt < settings.max_retries - 1:
                         wait_time = settings.retry_delay * (2 ** attempt)
                         logger.warning(f"Rate limited during contract init, retrying in {wait_time}s (attempt {attempt + 1}/{settings.max_retries})...")
-                    time.sleep(wait_time)
+                        time.sleep(wait_time)
+                        continue
+                    raise
                 else:
                     if '429' in str(e):
                         logger.error(f"Rate limit exceeded after {settings.max_retries} retries. Please wait a few minutes or add TRONGRID_API_KEY to .env")
@@ -139,23 +163,51 @@ class TronWallet:
             logger.error(f"Error getting balance for {address}: {e}")
             return Decimal(0)
     
+    @retry_on_rate_limit
+    def _fetch_usdt_balance(self, address: str) -> Decimal:
+        """balanceOf for one address; raises on errors"""
+        balance = self.usdt_contract.functions.balanceOf(address)
+        return Decimal(balance) / Decimal(10**6)
+    
+    def get_usdt_balances(self, addresses) -> dict:
+        """Get USDT balances for many addresses at once
+        
+        Lookups run in parallel (at most tron_balance_concurrency at a time)
+        over the pooled TronGrid connections. Returns
+        {'balances': {address: Decimal}, 'errors': {address: str}}; a failing
+        address is reported in 'errors' without affecting the others.
+        """
+        unique = list(dict.fromkeys(address for address in addresses if address))
+        if not self.usdt_contract:
+            logger.error("USDT contract not initialized")
+            return {'balances': {}, 'errors': {address: "USDT contract not initialized" for address in unique}}
+        
+        futures = {address: _balance_pool.submit(self._fetch_usdt_balance, address) for address in unique}
+        balances = {}
+        errors = {}
+        for address, future in futures.items():
+            try:
+                balances[address] = future.result()
+            except Exception as e:
+                errors[address] = str(e)
+        
+        if errors:
+            logger.warning(f"Could not get USDT balance for {len(errors)} of {len(unique)} addresses: {errors}")
+        return {'balances': balances, 'errors': errors}
+    
     @retry_on_rate_limit
     def get_trc20_transactions(self, address: str, limit: int = 50) -> list:
         """Get TRC-20 USDT transactions for an address"""
         try:
-            import requests
-            url = f"https://api.trongrid.io/v1/accounts/{address}/transactions/trc20"
             params = {
                 'limit': limit,
                 'contract_address': settings.usdt_trc20_contract
             }
-            headers = {}
-            if settings.trongrid_api_key:
-                headers['TRON-PRO-API-KEY'] = settings.trongrid_api_key
-            
-            response = requests.get(url, params=params, headers=headers, timeout=10)
-            response.raise_for_status()
-            data = response.json()
+            data = get_trongrid().get(
+                f"/v1/accounts/{address}/transactions/trc20",
+                params=params,
+                endpoint="/v1/accounts/{address}/transactions/trc20"
+            )
             
             return data.get('data', [])
         except Exception as e:
@@ -164,31 +216,30 @@ class TronWallet:
     
     @retry_on_rate_limit
     def get_transaction_confirmations(self, tx_id: str) -> int:
-        """Get number of confirmations for a transaction"""
+        """Get number of confirmations for a transaction
+        
+        Final transactions (tron_min_confirmations reached before) are answered
+        from the finality store without any network call.
+        """
         try:
-            import requests
-            url = f"https://api.trongrid.io/wallet/gettransactioninfobyid"
-            params = {'value': tx_id}
-            headers = {}
-            if settings.trongrid_api_key:
-                headers['TRON-PRO-API-KEY'] = settings.trongrid_api_key
+            finality = get_tx_finality_store()
+            record = finality.get(tx_id)
+            if record is not None and record[1]:
+                tx_block = record[0]
+                return max(settings.tron_min_confirmations, (block_height.current_height() or 0) - tx_block)
             
-            response = requests.post(url, json=params, headers=headers, timeout=10)
-            response.raise_for_status()
-            tx_info = response.json()
-            
-            if 'blockNumber' in tx_info:
-                # Get current block number
-                current_block_url = "https://api.trongrid.io/wallet/getnowblock"
-                block_response = requests.post(current_block_url, headers=headers, timeout=10)
-                block_response.raise_for_status()
-                current_block = block_response.json().get('block_header', {}).get('raw_data', {}).get('number', 0)
-                
+            if record is not None:
+                tx_block = record[0]
+            else:
+                tx_info = get_trongrid().post("/wallet/gettransactioninfobyid", json={'value': tx_id})
+                if 'blockNumber' not in tx_info:
+                    return 0  # Not in a block yet
                 tx_block = tx_info['blockNumber']
-                confirmations = current_block - tx_block
-                return max(0, confirmations)
             
-            return 0
+            # Shared head height, fetched at most once per block time
+            confirmations = max(0, block_height.height() - tx_block)
+            finality.save(tx_id, tx_block, finalized=confirmations >= settings.tron_min_confirmations)
+            return confirmations
         except Exception as e:
             logger.error(f"Error getting confirmations for tx {tx_id}: {e}")
             return 0
@@ -229,7 +280,7 @@ class TronWallet:
                                 min_confirmations = min(min_confirmations, confirmations)
                         
                         result['min_confirmations'] = min_confirmations if min_confirmations != float('inf') else 0
-                        result['confirmed'] = min_confirmations >= 20
+                        result['confirmed'] = min_confirmations >= settings.tron_min_confirmations
                         
                         logger.info(f"Address {address}: Balance={balance}, Min confirmations={result['min_confirmations']}, Confirmed={result['confirmed']}")
                     else:
@@ -284,5 +335,5 @@ class TronWallet:
             logger.error(f"Error sending USDT: {e}")
             return {'success': False, 'error': str(e)}
 
-# Singleton instance
-tron_wallet = TronWallet()
\ No newline at end of file
+# Singleton instance, created on first use
+get_tron_wallet = LazySingleton(TronWallet)
\ No newline at end of file
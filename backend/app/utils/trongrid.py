@@ -0,0 +1,150 @@
+"""Pooled, keep-alive HTTP clients for the TronGrid API.
+
+All TronGrid traffic of a process goes through one connection pool: direct
+REST calls use TronGridClient (or AsyncTronGridClient from async code), and
+the tronpy client is built on PooledHTTPProvider, which mounts the same pool.
+Every request is timed per endpoint in ``latency``.
+"""
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from tronpy.providers import HTTPProvider
+from ..config import settings
+from .lazy import LazySingleton
+
+logger = logging.getLogger(__name__)
+
+
+def trongrid_headers() -> Dict[str, str]:
+    headers = {'Accept': 'application/json'}
+    if settings.trongrid_api_key:
+        headers['TRON-PRO-API-KEY'] = settings.trongrid_api_key
+    return headers
+
+
+class TronGridLatency:
+    """Request count, errors and latency per TronGrid endpoint"""
+
+    def __init__(self):
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint: str, seconds: float, ok: bool):
+        with self._lock:
+            stats = self._stats.setdefault(endpoint, {'count': 0, 'errors': 0, 'total': 0.0, 'max': 0.0, 'last': 0.0})
+            stats['count'] += 1
+            stats['errors'] += 0 if ok else 1
+            stats['total'] += seconds
+            stats['max'] = max(stats['max'], seconds)
+            stats['last'] = seconds
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                endpoint: {
+                    'count': stats['count'],
+                    'errors': stats['errors'],
+                    'avg_ms': round(stats['total'] / stats['count'] * 1000, 1),
+                    'max_ms': round(stats['max'] * 1000, 1),
+                    'last_ms': round(stats['last'] * 1000, 1),
+                }
+                for endpoint, stats in sorted(self._stats.items())
+            }
+
+
+latency = TronGridLatency()
+
+
+class TronGridClient:
+    """Synchronous TronGrid client on a keep-alive requests.Session"""
+
+    def __init__(self):
+        self.base_url = settings.trongrid_api_url.rstrip('/')
+        self.adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.trongrid_pool_size)
+        self.session = requests.Session()
+        self.session.headers.update(trongrid_headers())
+        self.session.mount('https://', self.adapter)
+        self.session.mount('http://', self.adapter)
+
+    def request(self, method: str, path: str, endpoint: str = None, **kwargs) -> Any:
+        """Send a request and return the decoded JSON; raises requests errors like requests.get/post"""
+        started = time.perf_counter()
+        ok = False
+        try:
+            response = self.session.request(method, self.base_url + path, timeout=settings.trongrid_timeout_seconds, **kwargs)
+            response.raise_for_status()
+            ok = True
+            return response.json()
+        finally:
+            latency.record(endpoint or path, time.perf_counter() - started, ok)
+
+    def get(self, path: str, params: Optional[dict] = None, endpoint: str = None) -> Any:
+        return self.request('GET', path, endpoint, params=params)
+
+    def post(self, path: str, json: Optional[dict] = None, endpoint: str = None) -> Any:
+        return self.request('POST', path, endpoint, json=json)
+
+
+get_trongrid = LazySingleton(TronGridClient)
+
+
+class AsyncTronGridClient:
+    """TronGrid client for async code, on a keep-alive httpx.AsyncClient"""
+
+    def __init__(self):
+        self.client = httpx.AsyncClient(
+            base_url=settings.trongrid_api_url.rstrip('/'),
+            headers=trongrid_headers(),
+            timeout=settings.trongrid_timeout_seconds,
+            limits=httpx.Limits(max_connections=settings.trongrid_pool_size, max_keepalive_connections=settings.trongrid_pool_size),
+        )
+
+    async def request(self, method: str, path: str, endpoint: str = None, **kwargs) -> Any:
+        started = time.perf_counter()
+        ok = False
+        try:
+            response = await self.client.request(method, path, **kwargs)
+            response.raise_for_status()
+            ok = True
+            return response.json()
+        finally:
+            latency.record(endpoint or path, time.perf_counter() - started, ok)
+
+    async def get(self, path: str, params: Optional[dict] = None, endpoint: str = None) -> Any:
+        return await self.request('GET', path, endpoint, params=params)
+
+    async def post(self, path: str, json: Optional[dict] = None, endpoint: str = None) -> Any:
+        return await self.request('POST', path, endpoint, json=json)
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+get_async_trongrid = LazySingleton(AsyncTronGridClient)
+
+
+class PooledHTTPProvider(HTTPProvider):
+    """tronpy provider that shares TronGridClient's connection pool and records latency"""
+
+    def __init__(self):
+        super().__init__(
+            endpoint_uri=settings.trongrid_api_url,
+            timeout=settings.trongrid_timeout_seconds,
+            api_key=settings.trongrid_api_key or None,
+        )
+        self.sess.mount('https://', get_trongrid().adapter)
+        self.sess.mount('http://', get_trongrid().adapter)
+
+    def make_request(self, method: str, params: Any = None) -> dict:
+        started = time.perf_counter()
+        ok = False
+        try:
+            result = super().make_request(method, params)
+            ok = True
+            return result
+        finally:
+            latency.record('/' + method.lstrip('/'), time.perf_counter() - started, ok)
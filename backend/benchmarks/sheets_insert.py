@@ -0,0 +1,115 @@
+"""
+Insert latency benchmark for GoogleSheetsDB.create_transaction
+
+Grows an in-memory stand-in for the Transactions worksheet to 100k rows and
+times create_transaction at several sizes. Google is never contacted: the
+gspread client and service account credentials are patched out, so the
+numbers measure only our own per-insert work (ID allocation, row building,
+cache maintenance), which must stay flat as the sheet grows. The Sheets
+quota governor is switched off for the same reason.
+
+Run from the backend folder:
+    python benchmarks/sheets_insert.py
+"""
+
+import statistics
+import sys
+import time
+from pathlib import Path
+from unittest import mock
+
+import gspread
+
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+CHECKPOINTS = [1_000, 10_000, 50_000, 100_000]
+SAMPLES = 200
+
+
+class InMemoryWorksheet:
+    """Just enough of gspread.Worksheet for create_transaction"""
+
+    def __init__(self, title):
+        self.title = title
+        self.rows = []
+        self.full_reads = 0
+
+    def append_row(self, values, value_input_option='RAW', **kwargs):
+        return self.append_rows([values], value_input_option=value_input_option)
+
+    def append_rows(self, values, value_input_option='RAW', **kwargs):
+        first_row = len(self.rows) + 1
+        self.rows.extend([str(v) for v in row] for row in values)
+        return {'updates': {'updatedRange': f"{self.title}!A{first_row}:Q{len(self.rows)}"}}
+
+    def get_all_values(self):
+        self.full_reads += 1
+        return [list(row) for row in self.rows]
+
+    def get_all_records(self, **kwargs):
+        self.full_reads += 1
+        headers = self.rows[0]
+        return [dict(zip(headers, row)) for row in self.rows[1:]]
+
+    def col_values(self, col):
+        return [row[col - 1] if len(row) >= col else '' for row in self.rows]
+
+    def row_values(self, row):
+        return list(self.rows[row - 1])
+
+
+class InMemorySpreadsheet:
+    def __init__(self):
+        self.worksheets = {}
+
+    def worksheet(self, title):
+        if title not in self.worksheets:
+            raise gspread.WorksheetNotFound(title)
+        return self.worksheets[title]
+
+    def add_worksheet(self, title, rows, cols):
+        self.worksheets[title] = InMemoryWorksheet(title)
+        return self.worksheets[title]
+
+
+def main():
+    spreadsheet = InMemorySpreadsheet()
+    client = mock.Mock(open_by_key=mock.Mock(return_value=spreadsheet))
+
+    with mock.patch('gspread.authorize', return_value=client), \
+            mock.patch('google.oauth2.service_account.Credentials.from_service_account_file'), \
+            mock.patch('app.config.settings.sheets_reconcile_seconds', 0), \
+            mock.patch('app.config.settings.sheets_read_quota_per_minute', 0):
+        from app.sheets_db import GoogleSheetsDB
+        db = GoogleSheetsDB()
+
+    worksheet = spreadsheet.worksheets['Transactions']
+    template = {
+        'type': 'sell',
+        'amount_usdt': 100,
+        'amount_rub': 9500,
+        'payment_method': 'card',
+        'status': 'pending',
+    }
+
+    print(f"{'rows':>8} {'median µs':>10} {'p95 µs':>10} {'full reads':>11}")
+    for checkpoint in CHECKPOINTS:
+        while len(worksheet.rows) < checkpoint - SAMPLES:
+            db.create_transaction(dict(template, hash=f"fill-{len(worksheet.rows)}"))
+
+        reads_before = worksheet.full_reads
+        timings = []
+        for i in range(SAMPLES):
+            started = time.perf_counter()
+            db.create_transaction(dict(template, hash=f"bench-{checkpoint}-{i}"))
+            timings.append((time.perf_counter() - started) * 1_000_000)
+
+        timings.sort()
+        p95 = timings[int(len(timings) * 0.95) - 1]
+        print(f"{len(worksheet.rows):>8} {statistics.median(timings):>10.1f} {p95:>10.1f} "
+              f"{worksheet.full_reads - reads_before:>11}")
+
+
+if __name__ == "__main__":
+    main()